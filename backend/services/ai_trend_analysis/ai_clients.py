@@ -13,6 +13,15 @@ from typing import Optional, AsyncGenerator, Literal
 from dataclasses import dataclass
 from enum import Enum
 
+try:
+    # orjson is an optional, faster parser for agent JSON blocks; its
+    # JSONDecodeError subclasses json.JSONDecodeError. It is stricter than
+    # json.loads: NaN/Infinity literals and numbers beyond float range (e.g.
+    # 1e999) are rejected, so such blocks fall back to the parser defaults.
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 from core.config import settings
 from core.logging import get_logger
 
@@ -25,6 +34,65 @@ GEMINI3_FLASH = "gemini-3-flash-preview"
 GEMINI3_PRO = "gemini-3-pro-preview"
 DEFAULT_MODEL = GEMINI3_FLASH  # Fast streaming for demos
 
+# ---------------------------------------------------------------------------
+# Screenshot analysis prompts
+# ---------------------------------------------------------------------------
+IMAGE_ANALYSIS_PROMPT = """Analyze this product screenshot and extract:
+
+1. OBSERVATION: What do you see? (product name, brand, visual elements)
+2. ANALYSIS: Extract specific details:
+   - Product name
+   - Price (include currency)
+   - Key features listed
+   - Any promotional signals (discounts, badges, limited time offers)
+   - Customer reviews summary if visible
+3. HYPOTHESIS: What market positioning does this suggest?
+4. RECOMMENDATION: How should a competitor respond to this pricing?
+
+Be specific and structured in your analysis. Start each section with the thought type."""
+
+IMAGE_EXTRACTION_SCHEMA = """{
+  "product_name": "exact product name visible",
+  "price": "price as shown (e.g., '$29.99' or '29.99')",
+  "currency": "USD/EUR/GBP/etc",
+  "features": ["feature 1", "feature 2"],
+  "reviews_summary": "brief summary of reviews if visible, null otherwise",
+  "promo_signals": ["any discount badges", "limited time offers", "sale indicators"],
+  "confidence": 0.0 to 1.0 based on image clarity
+}"""
+
+# Streaming analysis that ends with the extraction JSON, so one call
+# yields both the live reasoning and the structured data.
+IMAGE_ANALYSIS_STRUCTURED_PROMPT = f"""{IMAGE_ANALYSIS_PROMPT}
+
+End with a JSON block containing the extracted data:
+```json
+{IMAGE_EXTRACTION_SCHEMA}
+```"""
+
+
+def extract_json_block(text: str) -> Optional[str]:
+    """
+    Return the contents of the first fenced code block in ``text``.
+
+    A ```json fence is preferred over a bare ``` fence. Returns None when
+    the text contains no fence at all.
+    """
+    # One scan settles the common cases: no fence at all, or a leading ```json
+    start = text.find("```")
+    if start == -1:
+        return None
+    if text.startswith("json", start + 3):
+        start += 7
+    else:
+        # A later ```json still wins over this bare fence
+        json_start = text.find("```json", start)
+        start = json_start + 7 if json_start != -1 else start + 3
+
+    # An unterminated fence runs to the end of the text
+    end = text.find("```", start)
+    return text[start:end] if end != -1 else text[start:]
+
 
 class ThoughtType(str, Enum):
     """Types of AI reasoning steps (thought signatures)."""
@@ -35,6 +103,16 @@ class ThoughtType(str, Enum):
     RECOMMENDATION = "recommendation"
 
 
+# Keyword fallback for thought classification, checked in priority order.
+_THOUGHT_KEYWORDS = (
+    (ThoughtType.OBSERVATION, ("i see", "looking at", "observing", "notice", "scanning")),
+    (ThoughtType.ANALYSIS, ("analyzing", "comparing", "examining", "this means", "evaluating")),
+    (ThoughtType.HYPOTHESIS, ("could be", "might", "possibly", "hypothesis", "if we")),
+    (ThoughtType.DECISION, ("therefore", "conclude", "decision", "determined", "verdict")),
+    (ThoughtType.RECOMMENDATION, ("recommend", "suggest", "should", "optimal", "strategy")),
+)
+
+
 @dataclass
 class StreamChunk:
     """A chunk of streamed AI response."""
@@ -62,6 +140,71 @@ class ImageAnalysisResult:
         if self.promo_signals is None:
             self.promo_signals = []
 
+    @classmethod
+    def from_dict(cls, data: dict, raw_text: str = "") -> "ImageAnalysisResult":
+        """Build a result from the extraction JSON returned by Gemini."""
+        return cls(
+            product_name=data.get("product_name"),
+            price=data.get("price"),
+            currency=data.get("currency"),
+            features=data.get("features", []),
+            reviews_summary=data.get("reviews_summary"),
+            promo_signals=data.get("promo_signals", []),
+            confidence=data.get("confidence", 0.5),
+            raw_text=raw_text,
+        )
+
+
+# Buffered stream text is flushed once it ends on one of these
+_CHUNK_BOUNDARIES = ("\n", ".", "!", "?")
+
+
+async def coalesce_chunks(
+    stream: AsyncGenerator[StreamChunk, None],
+    min_chars: int = 32,
+) -> AsyncGenerator[StreamChunk, None]:
+    """
+    Merge small streamed text chunks into fewer, larger ones.
+
+    Text is buffered until it reaches ``min_chars`` or ends on a sentence
+    boundary, so agents yield one message per phrase instead of one per
+    token. Thought and answer text are never merged together. The final
+    chunk flushes the buffer and is passed through unchanged.
+    """
+    parts: list[str] = []
+    size = 0
+    thought_type: Optional[ThoughtType] = None
+    is_thought = False
+
+    def merged() -> StreamChunk:
+        return StreamChunk(text="".join(parts), thought_type=thought_type, is_thought=is_thought)
+
+    async for chunk in stream:
+        if chunk.is_final:
+            if parts:
+                yield merged()
+                parts, size, thought_type = [], 0, None
+            yield chunk
+            continue
+        if not chunk.text:
+            continue
+
+        if parts and chunk.is_thought != is_thought:
+            yield merged()
+            parts, size, thought_type = [], 0, None
+
+        parts.append(chunk.text)
+        size += len(chunk.text)
+        thought_type = chunk.thought_type or thought_type
+        is_thought = chunk.is_thought
+
+        if size >= min_chars or chunk.text.endswith(_CHUNK_BOUNDARIES):
+            yield merged()
+            parts, size, thought_type = [], 0, None
+
+    if parts:
+        yield merged()
+
 
 class AIClients:
     """Manages AI client connections for OpenAI and Gemini."""
@@ -215,21 +358,23 @@ class AIClients:
     # ------------------------------------------------------------------
 
     @staticmethod
-    def _extract_thought_from_chunk(chunk) -> Optional[bool]:
+    def _extract_thought_from_chunk(chunk) -> bool:
         """
         Try to extract native Gemini 3 thought indicator from a chunk.
 
         Gemini 3 responses can include thought parts where
-        ``part.thought == True``. Returns True/False/None.
+        ``part.thought == True``. Well-formed chunks take the direct
+        attribute path; malformed ones (missing attributes, ``None``
+        lists) return False.
         """
         try:
-            for candidate in getattr(chunk, "candidates", []):
-                for part in getattr(candidate.content, "parts", []):
-                    if getattr(part, "thought", False):
+            for candidate in chunk.candidates:
+                for part in candidate.content.parts:
+                    if part.thought:
                         return True
             return False
-        except Exception:
-            return None
+        except (AttributeError, TypeError):
+            return False
 
     @staticmethod
     def _detect_thought_type(text: str) -> Optional[ThoughtType]:
@@ -242,16 +387,9 @@ class AIClients:
         """
         text_lower = text.lower()
 
-        if any(w in text_lower for w in ["i see", "looking at", "observing", "notice", "scanning"]):
-            return ThoughtType.OBSERVATION
-        elif any(w in text_lower for w in ["analyzing", "comparing", "examining", "this means", "evaluating"]):
-            return ThoughtType.ANALYSIS
-        elif any(w in text_lower for w in ["could be", "might", "possibly", "hypothesis", "if we"]):
-            return ThoughtType.HYPOTHESIS
-        elif any(w in text_lower for w in ["therefore", "conclude", "decision", "determined", "verdict"]):
-            return ThoughtType.DECISION
-        elif any(w in text_lower for w in ["recommend", "suggest", "should", "optimal", "strategy"]):
-            return ThoughtType.RECOMMENDATION
+        for thought_type, keywords in _THOUGHT_KEYWORDS:
+            if any(w in text_lower for w in keywords):
+                return thought_type
 
         return None
 
@@ -344,19 +482,7 @@ class AIClients:
                 return
 
             if analysis_prompt is None:
-                analysis_prompt = """Analyze this product screenshot and extract:
-
-1. OBSERVATION: What do you see? (product name, brand, visual elements)
-2. ANALYSIS: Extract specific details:
-   - Product name
-   - Price (include currency)
-   - Key features listed
-   - Any promotional signals (discounts, badges, limited time offers)
-   - Customer reviews summary if visible
-3. HYPOTHESIS: What market positioning does this suggest?
-4. RECOMMENDATION: How should a competitor respond to this pricing?
-
-Be specific and structured in your analysis. Start each section with the thought type."""
+                analysis_prompt = IMAGE_ANALYSIS_PROMPT
 
             image_base64 = base64.b64encode(image_data).decode("utf-8")
 
@@ -402,6 +528,29 @@ Be specific and structured in your analysis. Start each section with the thought
             logger.error(f"Image analysis failed: {e}")
             yield StreamChunk(text=f"Error analyzing image: {str(e)}", is_final=True)
 
+    def analyze_image_stream_structured(
+        self,
+        image_data: bytes,
+        image_type: Literal["png", "jpeg", "webp", "gif"] = "png",
+        model: str = DEFAULT_MODEL,
+        thinking_level: str = "low",
+    ) -> AsyncGenerator[StreamChunk, None]:
+        """
+        Stream a screenshot analysis that ends with a ```json extraction block.
+
+        Parse the block with ``extract_json_block`` and
+        ``ImageAnalysisResult.from_dict`` instead of making a second
+        ``analyze_image`` call. Returns the underlying stream directly, so
+        chunks don't pass through an extra generator.
+        """
+        return self.analyze_image_stream(
+            image_data=image_data,
+            image_type=image_type,
+            analysis_prompt=IMAGE_ANALYSIS_STRUCTURED_PROMPT,
+            model=model,
+            thinking_level=thinking_level,
+        )
+
     # ------------------------------------------------------------------
     # GEMINI 3 IMAGE ANALYSIS (structured, non-streaming)
     # ------------------------------------------------------------------
@@ -431,17 +580,9 @@ Be specific and structured in your analysis. Start each section with the thought
 
             image_base64 = base64.b64encode(image_data).decode("utf-8")
 
-            extraction_prompt = """Analyze this product screenshot and respond with ONLY a JSON object:
+            extraction_prompt = f"""Analyze this product screenshot and respond with ONLY a JSON object:
 
-{
-  "product_name": "exact product name visible",
-  "price": "price as shown (e.g., '$29.99' or '29.99')",
-  "currency": "USD/EUR/GBP/etc",
-  "features": ["feature 1", "feature 2"],
-  "reviews_summary": "brief summary of reviews if visible, null otherwise",
-  "promo_signals": ["any discount badges", "limited time offers", "sale indicators"],
-  "confidence": 0.0 to 1.0 based on image clarity
-}
+{IMAGE_EXTRACTION_SCHEMA}
 
 Respond with ONLY the JSON, no other text."""
 
@@ -470,23 +611,9 @@ Respond with ONLY the JSON, no other text."""
             text = response.text
 
             # Parse JSON from response
-            if "```json" in text:
-                text = text.split("```json")[1].split("```")[0]
-            elif "```" in text:
-                text = text.split("```")[1].split("```")[0]
-
-            data = json.loads(text.strip())
+            data = json.loads((extract_json_block(text) or text).strip())
 
-            return ImageAnalysisResult(
-                product_name=data.get("product_name"),
-                price=data.get("price"),
-                currency=data.get("currency"),
-                features=data.get("features", []),
-                reviews_summary=data.get("reviews_summary"),
-                promo_signals=data.get("promo_signals", []),
-                confidence=data.get("confidence", 0.5),
-                raw_text=response.text,
-            )
+            return ImageAnalysisResult.from_dict(data, raw_text=text)
 
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse image analysis JSON: {e}")
@@ -9,8 +9,9 @@ Agents:
 Uses Gemini 3 streaming with 1M token context for comprehensive analysis.
 """
 
-import json
-from typing import Optional, AsyncGenerator, List
+from bisect import bisect_left
+from operator import attrgetter, itemgetter
+from typing import Optional, AsyncGenerator, List, Union
 from dataclasses import dataclass, field
 from enum import Enum
 from datetime import datetime, timedelta
@@ -22,6 +23,8 @@ from services.ai_trend_analysis.ai_clients import (
     DEFAULT_MODEL,
     StreamChunk,
     ThoughtType,
+    extract_json_block,
+    json_loads,
 )
 
 logger = get_logger(__name__)
@@ -43,6 +46,19 @@ class CrisisSeverity(str, Enum):
     CRITICAL = "critical"
 
 
+# Severity cut-offs for |sentiment_change| and volume_change. A metric has to
+# strictly exceed a cut-off to reach the next level up.
+_SENTIMENT_SEVERITY_THRESHOLDS = (0.1, 0.2, 0.4, 0.6)
+_VOLUME_SEVERITY_THRESHOLDS = (0.5, 1.5, 3, 5)
+_SEVERITY_LEVELS = (
+    CrisisSeverity.NONE,
+    CrisisSeverity.LOW,
+    CrisisSeverity.MEDIUM,
+    CrisisSeverity.HIGH,
+    CrisisSeverity.CRITICAL,
+)
+
+
 @dataclass
 class CrisisAgentMessage:
     """A message from an agent during crisis analysis."""
@@ -53,7 +69,7 @@ class CrisisAgentMessage:
     metadata: dict = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(slots=True)
 class SentimentDataPoint:
     """A single sentiment data point for analysis."""
     timestamp: datetime
@@ -63,6 +79,108 @@ class SentimentDataPoint:
     sample_text: Optional[str] = None
 
 
+# Sort key for data points; a C-level getter avoids a Python frame per item
+_BY_TIMESTAMP = attrgetter("timestamp")
+
+
+@dataclass(slots=True)
+class SentimentBatch:
+    """
+    Column-oriented sentiment data for analysis.
+    
+    The columns are parallel and ordered by timestamp. Callers that already
+    hold columnar data can pass a batch anywhere a list of SentimentDataPoint
+    is accepted, without building one object per row.
+    """
+    timestamps: List[datetime]
+    scores: List[float]
+    volumes: List[int]
+    sources: List[str]
+    sample_texts: List[Optional[str]]
+    
+    def __len__(self) -> int:
+        return len(self.scores)
+    
+    @classmethod
+    def from_points(
+        cls,
+        points: List[SentimentDataPoint],
+        assume_sorted: bool = False
+    ) -> "SentimentBatch":
+        """
+        Sort points by time and split them into columns.
+        
+        Pass assume_sorted=True when the points already arrive in timestamp
+        order (e.g. from a time-ordered feed) to skip the sort.
+        """
+        ordered = points if assume_sorted else sorted(points, key=_BY_TIMESTAMP)
+        return cls(
+            timestamps=list(map(_BY_TIMESTAMP, ordered)),
+            scores=list(map(attrgetter("score"), ordered)),
+            volumes=list(map(attrgetter("volume"), ordered)),
+            sources=list(map(attrgetter("source"), ordered)),
+            sample_texts=list(map(attrgetter("sample_text"), ordered)),
+        )
+    
+    def to_points(self) -> List[SentimentDataPoint]:
+        """Rebuild individual data points, in time order."""
+        return list(map(
+            SentimentDataPoint,
+            self.timestamps, self.scores, self.volumes, self.sources, self.sample_texts
+        ))
+
+
+SentimentInput = Union[List[SentimentDataPoint], SentimentBatch]
+
+_ROW_FIELDS = attrgetter("timestamp", "score", "volume", "source", "sample_text")
+
+
+# Data summary line templates; %.100s truncates the sample to 100 characters
+_SUMMARY_ROW = "[%s] Score: %.2f (%s%.2f) | Volume: %s mentions | Source: %s"
+_SUMMARY_SAMPLE = '  Sample: "%.100s..."'
+
+
+def _as_batch(data: SentimentInput) -> SentimentBatch:
+    """Reuse a batch as is, or build one from raw points."""
+    if isinstance(data, SentimentBatch):
+        return data
+    return SentimentBatch.from_points(data)
+
+
+def _anomaly_kernel(
+    scores: List[float],
+    volumes: List[int]
+) -> tuple[float, float, float, int]:
+    """
+    Numeric core of the anomaly check over time-sorted columns.
+    
+    Returns (sentiment_change, volume_change, recent_sentiment, peak_idx),
+    comparing the older half of the window against the recent half. peak_idx
+    is the earliest position of the lowest score.
+    """
+    # Split at midpoint; a single point is compared against itself
+    midpoint = len(scores) // 2
+    old_scores = scores[:midpoint] if midpoint > 0 else scores
+    recent_scores = scores[midpoint:] if midpoint > 0 else scores
+    old_volumes = volumes[:midpoint] if midpoint > 0 else volumes
+    recent_volumes = volumes[midpoint:] if midpoint > 0 else volumes
+    
+    old_sentiment = sum(old_scores) / len(old_scores)
+    recent_sentiment = sum(recent_scores) / len(recent_scores)
+    old_volume = sum(old_volumes) / len(old_volumes)
+    recent_volume = sum(recent_volumes) / len(recent_volumes)
+    
+    sentiment_change = (recent_sentiment - old_sentiment) / max(abs(old_sentiment), 0.1)
+    volume_change = (recent_volume - old_volume) / max(old_volume, 1)
+    
+    return sentiment_change, volume_change, recent_sentiment, scores.index(min(scores))
+
+
+def _default_response_plan() -> dict:
+    """Fallback response plan when the strategist output has no usable JSON."""
+    return {"crisis_title": "Crisis Response Plan", "immediate_actions": []}
+
+
 @dataclass
 class CrisisAlert:
     """Final crisis alert from the system."""
@@ -106,7 +224,7 @@ class CrisisDetector:
     
     async def run_monitor_agent(
         self,
-        sentiment_data: List[SentimentDataPoint],
+        sentiment_data: SentimentInput,
         product_name: str,
         baseline_sentiment: float = 0.0
     ) -> AsyncGenerator[CrisisAgentMessage, None]:
@@ -121,8 +239,11 @@ class CrisisDetector:
             content=f"🔍 Monitor Agent activated. Scanning {len(sentiment_data)} data points for {product_name}..."
         )
         
+        # Sort once; the summary and the anomaly metrics share this batch
+        batch = _as_batch(sentiment_data)
+        
         # Prepare data summary for Gemini
-        data_summary = self._prepare_data_summary(sentiment_data, baseline_sentiment)
+        data_summary = self._prepare_data_summary(batch, baseline_sentiment)
         
         monitor_prompt = f"""You are a crisis monitoring agent for brand sentiment analysis.
 
@@ -155,7 +276,7 @@ Flag anything where sentiment dropped more than 30% or volume spiked more than 2
         
         # Calculate actual metrics
         anomaly_detected, metrics = self._calculate_anomaly_metrics(
-            sentiment_data, baseline_sentiment
+            batch, baseline_sentiment
         )
         
         status = "⚠️ ANOMALY DETECTED" if anomaly_detected else "✅ No crisis indicators"
@@ -183,7 +304,7 @@ Flag anything where sentiment dropped more than 30% or volume spiked more than 2
     
     async def run_investigator_agent(
         self,
-        sentiment_data: List[SentimentDataPoint],
+        sentiment_data: SentimentInput,
         product_name: str,
         monitoring_result: dict
     ) -> AsyncGenerator[CrisisAgentMessage, None]:
@@ -337,61 +458,53 @@ End with a JSON block:
     
     def _prepare_data_summary(
         self, 
-        data: List[SentimentDataPoint],
+        data: SentimentInput,
         baseline: float
     ) -> str:
         """Prepare sentiment data as text summary for Gemini."""
-        if not data:
+        if not len(data):
             return "No data available"
         
+        # Last 50 points in time order
+        if isinstance(data, SentimentBatch):
+            rows = zip(
+                data.timestamps[-50:], data.scores[-50:], data.volumes[-50:],
+                data.sources[-50:], data.sample_texts[-50:]
+            )
+        else:
+            rows = map(_ROW_FIELDS, sorted(data, key=_BY_TIMESTAMP)[-50:])
+        
         lines = []
-        for dp in sorted(data, key=lambda x: x.timestamp)[-50:]:  # Last 50 points
-            time_str = dp.timestamp.strftime("%Y-%m-%d %H:%M")
-            diff = dp.score - baseline
+        for ts, score, volume, source, sample_text in rows:
+            # "YYYY-MM-DD HH:MM"; the slice drops any UTC offset on aware datetimes
+            time_str = ts.isoformat(" ", "minutes")[:16]
+            diff = score - baseline
             direction = "↑" if diff > 0 else "↓" if diff < 0 else "→"
-            lines.append(
-                f"[{time_str}] Score: {dp.score:.2f} ({direction}{abs(diff):.2f}) | "
-                f"Volume: {dp.volume} mentions | Source: {dp.source}"
-            )
-            if dp.sample_text:
-                lines.append(f"  Sample: \"{dp.sample_text[:100]}...\"")
+            lines.append(_SUMMARY_ROW % (time_str, score, direction, abs(diff), volume, source))
+            if sample_text:
+                lines.append(_SUMMARY_SAMPLE % sample_text)
         
         return "\n".join(lines)
     
     def _calculate_anomaly_metrics(
         self,
-        data: List[SentimentDataPoint],
+        data: SentimentInput,
         baseline: float
     ) -> tuple[bool, dict]:
         """Calculate anomaly metrics from sentiment data."""
-        if not data:
+        # Work on the time-sorted score/volume columns
+        batch = _as_batch(data)
+        scores = batch.scores
+        if not scores:
             return False, {
                 'sentiment_change': 0,
                 'volume_change': 0,
                 'current_sentiment': baseline
             }
         
-        # Sort by time
-        sorted_data = sorted(data, key=lambda x: x.timestamp)
-        
-        # Get recent vs older data (split at midpoint)
-        midpoint = len(sorted_data) // 2
-        old_data = sorted_data[:midpoint] if midpoint > 0 else sorted_data
-        recent_data = sorted_data[midpoint:] if midpoint > 0 else sorted_data
-        
-        # Calculate averages
-        old_sentiment = sum(d.score for d in old_data) / len(old_data) if old_data else baseline
-        recent_sentiment = sum(d.score for d in recent_data) / len(recent_data) if recent_data else baseline
-        
-        old_volume = sum(d.volume for d in old_data) / len(old_data) if old_data else 1
-        recent_volume = sum(d.volume for d in recent_data) / len(recent_data) if recent_data else 1
-        
-        # Calculate changes
-        sentiment_change = (recent_sentiment - old_sentiment) / max(abs(old_sentiment), 0.1)
-        volume_change = (recent_volume - old_volume) / max(old_volume, 1)
-        
-        # Find peak negative
-        most_negative = min(data, key=lambda x: x.score)
+        sentiment_change, volume_change, recent_sentiment, peak_idx = _anomaly_kernel(
+            scores, batch.volumes
+        )
         
         # Detect anomaly
         anomaly_detected = (
@@ -403,74 +516,80 @@ End with a JSON block:
             'sentiment_change': sentiment_change,
             'volume_change': volume_change,
             'current_sentiment': recent_sentiment,
-            'peak_negative_time': most_negative.timestamp.isoformat(),
-            'peak_negative_score': most_negative.score
+            'peak_negative_time': batch.timestamps[peak_idx].isoformat(),
+            'peak_negative_score': scores[peak_idx]
         }
     
     def _get_negative_samples(
         self, 
-        data: List[SentimentDataPoint], 
+        data: SentimentInput, 
         limit: int = 20
     ) -> str:
         """Get sample negative mentions for investigation."""
-        negative = [d for d in data if d.score < 0 and d.sample_text]
-        negative.sort(key=lambda x: x.score)  # Most negative first
+        if isinstance(data, SentimentBatch):
+            negative = [
+                row for row in zip(data.sources, data.scores, data.sample_texts)
+                if row[1] < 0 and row[2]
+            ]
+        else:
+            negative = [
+                (d.source, d.score, d.sample_text) for d in data
+                if d.score < 0 and d.sample_text
+            ]
+        negative.sort(key=itemgetter(1))  # Most negative first
         
         if not negative:
             return "No negative samples available"
         
         samples = []
-        for d in negative[:limit]:
+        for source, score, sample_text in negative[:limit]:
             samples.append(
-                f"[{d.source}] Score: {d.score:.2f}\n\"{d.sample_text}\""
+                f"[{source}] Score: {score:.2f}\n\"{sample_text}\""
             )
         
         return "\n\n".join(samples)
     
-    def _get_affected_sources(self, data: List[SentimentDataPoint]) -> List[str]:
+    def _get_affected_sources(self, data: SentimentInput) -> List[str]:
         """Get list of sources with negative sentiment."""
-        source_scores = {}
-        for d in data:
-            if d.source not in source_scores:
-                source_scores[d.source] = []
-            source_scores[d.source].append(d.score)
+        # Running score total per source; a mean is negative iff its total is
+        source_totals = {}
+        if isinstance(data, SentimentBatch):
+            for source, score in zip(data.sources, data.scores):
+                source_totals[source] = source_totals.get(source, 0.0) + score
+        else:
+            for d in data:
+                source_totals[d.source] = source_totals.get(d.source, 0.0) + d.score
         
         # Return sources with negative average
-        return [
-            source for source, scores in source_scores.items()
-            if sum(scores) / len(scores) < 0
-        ]
+        return [source for source, total in source_totals.items() if total < 0]
     
     def _assess_severity(self, monitoring_result: dict) -> CrisisSeverity:
         """Assess crisis severity based on metrics."""
         sentiment_change = abs(monitoring_result.get('sentiment_change', 0))
         volume_change = monitoring_result.get('volume_change', 0)
         
-        if sentiment_change > 0.6 or volume_change > 5:
-            return CrisisSeverity.CRITICAL
-        elif sentiment_change > 0.4 or volume_change > 3:
-            return CrisisSeverity.HIGH
-        elif sentiment_change > 0.2 or volume_change > 1.5:
-            return CrisisSeverity.MEDIUM
-        elif sentiment_change > 0.1 or volume_change > 0.5:
-            return CrisisSeverity.LOW
-        else:
-            return CrisisSeverity.NONE
+        # bisect_left counts the cut-offs strictly below each value
+        level = max(
+            bisect_left(_SENTIMENT_SEVERITY_THRESHOLDS, sentiment_change),
+            bisect_left(_VOLUME_SEVERITY_THRESHOLDS, volume_change),
+        )
+        return _SEVERITY_LEVELS[level]
     
     def _parse_response_json(self, response: str) -> dict:
         """Parse the JSON response plan from strategist."""
+        json_str = (extract_json_block(response) or "").strip()
+        
+        # The plan must be a JSON object; skip the parser (and its exception
+        # path) when the block plainly isn't one
+        if not json_str.startswith("{"):
+            logger.warning("Failed to parse response JSON: no JSON object in response")
+            return _default_response_plan()
+        
         try:
-            if "```json" in response:
-                json_str = response.split("```json")[1].split("```")[0]
-            elif "```" in response:
-                json_str = response.split("```")[1].split("```")[0]
-            else:
-                return {"crisis_title": "Crisis Response Plan", "immediate_actions": []}
-            
-            return json.loads(json_str.strip())
+            return json_loads(json_str)
         except Exception as e:
             logger.warning(f"Failed to parse response JSON: {e}")
-            return {"crisis_title": "Crisis Response Plan", "immediate_actions": []}
+            return _default_response_plan()
     
     # =========================================================================
     # FULL ORCHESTRATION
@@ -478,7 +597,7 @@ End with a JSON block:
     
     async def analyze(
         self,
-        sentiment_data: List[SentimentDataPoint],
+        sentiment_data: SentimentInput,
         product_name: str,
         baseline_sentiment: float = 0.0
     ) -> AsyncGenerator[CrisisAgentMessage, None]:
@@ -486,7 +605,7 @@ End with a JSON block:
         Run the full crisis detection pipeline.
         
         Args:
-            sentiment_data: List of sentiment data points to analyze
+            sentiment_data: Sentiment data points, or a SentimentBatch, to analyze
             product_name: Name of the product/brand being monitored
             baseline_sentiment: Normal sentiment level (-1.0 to 1.0)
             
@@ -503,9 +622,12 @@ End with a JSON block:
             )
             return
         
+        # Sorted once and shared by the monitor and investigator
+        batch = _as_batch(sentiment_data)
+        
         # Phase 1: Monitor Agent
         monitoring_result = {}
-        async for msg in self.run_monitor_agent(sentiment_data, product_name, baseline_sentiment):
+        async for msg in self.run_monitor_agent(batch, product_name, baseline_sentiment):
             yield msg
             if msg.is_final and msg.metadata.get("monitoring_result"):
                 monitoring_result = msg.metadata["monitoring_result"]
@@ -523,7 +645,7 @@ End with a JSON block:
         
         # Phase 2: Investigator Agent
         investigation_result = {}
-        async for msg in self.run_investigator_agent(sentiment_data, product_name, monitoring_result):
+        async for msg in self.run_investigator_agent(batch, product_name, monitoring_result):
             yield msg
             if msg.is_final and msg.metadata.get("investigation_result"):
                 investigation_result = msg.metadata["investigation_result"]
@@ -9,7 +9,9 @@ Agents:
 Uses Gemini 3 streaming with multimodal support for image analysis.
 """
 
-import json
+import sys
+from heapq import nlargest
+from operator import attrgetter
 from typing import Optional, AsyncGenerator, List
 from dataclasses import dataclass, field
 from enum import Enum
@@ -21,6 +23,8 @@ from services.ai_trend_analysis.ai_clients import (
     DEFAULT_MODEL,
     StreamChunk,
     ThoughtType,
+    extract_json_block,
+    json_loads,
 )
 
 logger = get_logger(__name__)
@@ -62,7 +66,7 @@ class LaunchMessage:
     metadata: dict = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(slots=True)
 class LaunchSignal:
     """A signal indicating potential product launch."""
     source: str  # twitter, reddit, screenshot, news, press_release
@@ -73,6 +77,64 @@ class LaunchSignal:
     author: Optional[str] = None
     image_data: Optional[bytes] = None
     image_type: str = "png"
+    _content_lower: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        # Sources come from a small vocabulary; interning makes repeats share one object
+        # Only exact str can be interned; str subclasses (e.g. str Enums) are kept as-is
+        if type(self.source) is str:
+            self.source = sys.intern(self.source)
+    
+    @property
+    def content_lower(self) -> str:
+        """Lowercased content, computed on first use and reused across scans."""
+        if self._content_lower is None:
+            self._content_lower = self.content.lower()
+        return self._content_lower
+
+
+_BY_ENGAGEMENT = attrgetter("engagement")
+
+# Above this many signals heapq.nlargest beats a full sort; below it sorted() is 3-4x faster
+_HEAP_SELECT_MIN_SIGNALS = 200
+
+# Launch indicator keywords
+_LAUNCH_KEYWORDS = (
+    "new product", "launching", "announcing", "introducing",
+    "released", "unveiled", "debuting", "available now",
+    "coming soon", "pre-order", "just dropped", "brand new"
+)
+
+# Phrases in the scanner's own response that signal a confident launch call
+_STRONG_INDICATORS = ("announcing", "introducing", "launching today", "now available")
+
+
+def _default_validation() -> dict:
+    """Fallback validator result; list fields are fresh on every call."""
+    return {
+        "is_confirmed_launch": False,
+        "launch_type": "unknown",
+        "confidence": 0,
+        "product_name": "Unknown",
+        "key_features": [],
+        "target_market": "Unknown",
+        "estimated_price": None,
+        "launch_date": "TBD"
+    }
+
+
+def _default_assessment() -> dict:
+    """Fallback assessor result; list fields are fresh on every call."""
+    return {
+        "threat_level": "medium",
+        "threat_score": 50,
+        "urgency": "monitor",
+        "impact_areas": [],
+        "at_risk_segments": [],
+        "immediate_actions": [],
+        "strategic_actions": [],
+        "monitoring_priorities": []
+    }
 
 
 @dataclass
@@ -113,12 +175,7 @@ class LaunchDetector:
         self.min_confidence = 0.3  # Minimum confidence to proceed to validation
         self.min_signals = 1  # Minimum signals needed for analysis
         
-        # Launch indicator keywords
-        self.launch_keywords = [
-            "new product", "launching", "announcing", "introducing",
-            "released", "unveiled", "debuting", "available now",
-            "coming soon", "pre-order", "just dropped", "brand new"
-        ]
+        self.launch_keywords = _LAUNCH_KEYWORDS
     
     # =========================================================================
     # SCANNER AGENT - Detect launch signals from images/text
@@ -526,7 +583,7 @@ End with a structured JSON block:
         
         lines = []
         for i, sig in enumerate(signals[:20], 1):  # Limit to 20 signals
-            timestamp = sig.timestamp.strftime("%Y-%m-%d %H:%M") if sig.timestamp else "Unknown time"
+            timestamp = sig.timestamp.isoformat(" ", "minutes")[:16] if sig.timestamp else "Unknown time"
             engagement = f" | Engagement: {sig.engagement}" if sig.engagement > 0 else ""
             author = f" | @{sig.author}" if sig.author else ""
             
@@ -540,11 +597,14 @@ End with a structured JSON block:
     
     def _get_detailed_signals(self, signals: List[LaunchSignal], limit: int = 5) -> str:
         """Get detailed content from top signals for validation."""
-        # Sort by engagement if available
-        sorted_signals = sorted(signals, key=lambda x: x.engagement, reverse=True)
+        # Sort by engagement if available; heap-select only pays off on big batches
+        if len(signals) > _HEAP_SELECT_MIN_SIGNALS:
+            top_signals = nlargest(limit, signals, key=_BY_ENGAGEMENT)
+        else:
+            top_signals = sorted(signals, key=_BY_ENGAGEMENT, reverse=True)[:limit]
         
         lines = []
-        for sig in sorted_signals[:limit]:
+        for sig in top_signals:
             lines.append(f"=== [{sig.source.upper()}] ===")
             lines.append(sig.content)
             lines.append("")
@@ -552,8 +612,8 @@ End with a structured JSON block:
         return "\n".join(lines) if lines else "No detailed signals available"
     
     def _get_signal_sources(self, signals: List[LaunchSignal]) -> List[str]:
-        """Get unique sources from signals."""
-        return list(set(sig.source for sig in signals))
+        """Get unique sources from signals, in first-seen order."""
+        return list(dict.fromkeys(sig.source for sig in signals))
     
     def _analyze_scanner_response(
         self, 
@@ -563,17 +623,22 @@ End with a structured JSON block:
         """Analyze scanner response to determine launch detection."""
         response_lower = response.lower()
         
-        # Count keyword matches
-        keyword_matches = sum(
-            1 for kw in self.launch_keywords 
-            if kw in response_lower
-        )
-        
-        # Check signal content for launch keywords
-        signal_matches = sum(
-            1 for sig in signals
-            if any(kw in sig.content.lower() for kw in self.launch_keywords)
-        )
+        # Count keyword matches (scoring only distinguishes 1 and 3+, so stop at 3)
+        keyword_matches = 0
+        for kw in self.launch_keywords:
+            if kw in response_lower:
+                keyword_matches += 1
+                if keyword_matches == 3:
+                    break
+        
+        # Check signal content for launch keywords (likewise 1 and 2+)
+        signal_matches = 0
+        for sig in signals:
+            content = sig.content_lower
+            if any(kw in content for kw in self.launch_keywords):
+                signal_matches += 1
+                if signal_matches == 2:
+                    break
         
         # Calculate confidence
         base_confidence = 0.0
@@ -589,8 +654,7 @@ End with a structured JSON block:
             base_confidence += 0.2
         
         # Boost for strong indicators
-        strong_indicators = ["announcing", "introducing", "launching today", "now available"]
-        if any(ind in response_lower for ind in strong_indicators):
+        if any(ind in response_lower for ind in _STRONG_INDICATORS):
             base_confidence += 0.2
         
         confidence = min(base_confidence, 1.0)
@@ -600,59 +664,35 @@ End with a structured JSON block:
     
     def _parse_validator_json(self, response: str) -> dict:
         """Parse the JSON validation result."""
-        default = {
-            "is_confirmed_launch": False,
-            "launch_type": "unknown",
-            "confidence": 0,
-            "product_name": "Unknown",
-            "key_features": [],
-            "target_market": "Unknown",
-            "estimated_price": None,
-            "launch_date": "TBD"
-        }
+        result = _default_validation()
+        
+        # No fence, or a block that plainly isn't an object: skip the parser
+        json_str = (extract_json_block(response) or "").strip()
+        if not json_str.startswith("{"):
+            logger.warning("Failed to parse validator JSON: no JSON object in response")
+            return result
         
         try:
-            if "```json" in response:
-                json_str = response.split("```json")[1].split("```")[0]
-            elif "```" in response:
-                json_str = response.split("```")[1].split("```")[0]
-            else:
-                return default
-            
-            parsed = json.loads(json_str.strip())
-            return {**default, **parsed}
-            
+            result.update(json_loads(json_str))
         except Exception as e:
             logger.warning(f"Failed to parse validator JSON: {e}")
-            return default
+        return result
     
     def _parse_assessor_json(self, response: str) -> dict:
         """Parse the JSON assessment result."""
-        default = {
-            "threat_level": "medium",
-            "threat_score": 50,
-            "urgency": "monitor",
-            "impact_areas": [],
-            "at_risk_segments": [],
-            "immediate_actions": [],
-            "strategic_actions": [],
-            "monitoring_priorities": []
-        }
+        result = _default_assessment()
+        
+        # No fence, or a block that plainly isn't an object: skip the parser
+        json_str = (extract_json_block(response) or "").strip()
+        if not json_str.startswith("{"):
+            logger.warning("Failed to parse assessor JSON: no JSON object in response")
+            return result
         
         try:
-            if "```json" in response:
-                json_str = response.split("```json")[1].split("```")[0]
-            elif "```" in response:
-                json_str = response.split("```")[1].split("```")[0]
-            else:
-                return default
-            
-            parsed = json.loads(json_str.strip())
-            return {**default, **parsed}
-            
+            result.update(json_loads(json_str))
         except Exception as e:
             logger.warning(f"Failed to parse assessor JSON: {e}")
-            return default
+        return result
     
     # =========================================================================
     # FULL ORCHESTRATION
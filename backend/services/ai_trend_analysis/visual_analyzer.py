@@ -9,7 +9,6 @@ Agents:
 Uses Gemini streaming for real-time "thinking" display.
 """
 
-import json
 import re
 from typing import Optional, AsyncGenerator
 from dataclasses import dataclass, field
@@ -22,11 +21,20 @@ from services.ai_trend_analysis.ai_clients import (
     DEFAULT_MODEL,
     StreamChunk, 
     ThoughtType,
-    ImageAnalysisResult
+    ImageAnalysisResult,
+    coalesce_chunks,
+    extract_json_block,
+    json_loads
 )
 
 logger = get_logger(__name__)
 
+# (market_position, price_differential_percent) when no usable competitor price
+_UNKNOWN_POSITION = ("unknown", 0.0)
+
+# Unfenced fallback: a flat JSON object carrying the recommended price
+_RECO_RE = re.compile(r'\{[^{}]*"recommended_price"[^{}]*\}')
+
 
 class AgentRole(str, Enum):
     """The three agents in our pricing intelligence system."""
@@ -35,7 +43,7 @@ class AgentRole(str, Enum):
     STRATEGIST = "strategist"
 
 
-@dataclass
+@dataclass(slots=True)
 class AgentMessage:
     """A message from an agent during analysis."""
     agent: AgentRole
@@ -45,7 +53,7 @@ class AgentMessage:
     metadata: dict = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(slots=True)
 class ProductInfo:
     """Information about a product (yours or competitor's)."""
     name: str
@@ -57,7 +65,7 @@ class ProductInfo:
     source: str = "manual"  # "manual" or "screenshot"
 
 
-@dataclass
+@dataclass(slots=True)
 class PricingRecommendation:
     """Final pricing recommendation from the Strategist."""
     recommended_price: Decimal
@@ -105,27 +113,32 @@ class VisualPricingAnalyzer:
             content="🔍 Scout Agent activated. Analyzing competitor screenshot..."
         )
         
-        # Use the streaming image analysis
-        full_response = ""
-        async for chunk in ai_clients.analyze_image_stream(
+        # Use the streaming image analysis (ends with an extraction JSON block).
+        # The text is only needed once, for the JSON parse, so collect the
+        # pieces and join them at the end.
+        response_parts = []
+        async for chunk in coalesce_chunks(ai_clients.analyze_image_stream_structured(
             image_data=image_data,
             image_type=image_type,
             model=self.model
-        ):
+        )):
             if chunk.text and not chunk.is_final:
-                full_response += chunk.text
+                response_parts.append(chunk.text)
                 yield AgentMessage(
                     agent=AgentRole.SCOUT,
                     thought_type=chunk.thought_type or ThoughtType.OBSERVATION,
                     content=chunk.text
                 )
         
-        # Also get structured data
-        structured_result = await ai_clients.analyze_image(
-            image_data=image_data,
-            image_type=image_type,
-            model=self.model
-        )
+        # Structured data comes from the stream's JSON block; only fall back
+        # to a separate extraction call when the block is missing
+        structured_result = self._parse_scout_json("".join(response_parts))
+        if structured_result is None:
+            structured_result = await ai_clients.analyze_image(
+                image_data=image_data,
+                image_type=image_type,
+                model=self.model
+            )
         
         yield AgentMessage(
             agent=AgentRole.SCOUT,
@@ -144,6 +157,19 @@ class VisualPricingAnalyzer:
             }
         )
     
+    def _parse_scout_json(self, response: str) -> Optional[ImageAnalysisResult]:
+        """Parse the extraction JSON block that ends the scout stream."""
+        json_str = extract_json_block(response)
+        if json_str is None:
+            return None
+        
+        try:
+            data = json_loads(json_str)
+            return ImageAnalysisResult.from_dict(data, raw_text=response)
+        except Exception as e:
+            logger.warning(f"Failed to parse scout JSON: {e}")
+            return None
+    
     # =========================================================================
     # ANALYST AGENT - Compare products and market positioning
     # =========================================================================
@@ -158,6 +184,8 @@ class VisualPricingAnalyzer:
         
         Yields AgentMessage objects with real-time analysis.
         """
+        your_price = float(your_product.price)
+        
         yield AgentMessage(
             agent=AgentRole.ANALYST,
             thought_type=ThoughtType.OBSERVATION,
@@ -188,7 +216,7 @@ Analyze step by step:
 Be specific and use the actual numbers provided."""
 
         full_response = ""
-        async for chunk in ai_clients.stream_gemini3(analysis_prompt, model=self.model):
+        async for chunk in coalesce_chunks(ai_clients.stream_gemini3(analysis_prompt, model=self.model)):
             if chunk.text and not chunk.is_final:
                 full_response += chunk.text
                 yield AgentMessage(
@@ -198,21 +226,9 @@ Be specific and use the actual numbers provided."""
                 )
         
         # Calculate price differential
-        try:
-            your_price = float(your_product.price)
-            competitor_price_str = competitor_data.get('price', '0')
-            # Clean price string (remove currency symbols)
-            competitor_price = float(''.join(c for c in competitor_price_str if c.isdigit() or c == '.'))
-            
-            if competitor_price > 0:
-                price_diff_percent = ((your_price - competitor_price) / competitor_price) * 100
-                position = "premium" if price_diff_percent > 5 else "discount" if price_diff_percent < -5 else "competitive"
-            else:
-                price_diff_percent = 0
-                position = "unknown"
-        except (ValueError, TypeError):
-            price_diff_percent = 0
-            position = "unknown"
+        position, price_diff_percent = self._calculate_price_position(
+            your_price, competitor_data.get('price')
+        )
         
         yield AgentMessage(
             agent=AgentRole.ANALYST,
@@ -228,6 +244,32 @@ Be specific and use the actual numbers provided."""
             }
         )
     
+    def _calculate_price_position(
+        self,
+        your_price: float,
+        competitor_price_str: Optional[str]
+    ) -> tuple[str, float]:
+        """Classify your price against the competitor's scraped price string."""
+        if not competitor_price_str:
+            return _UNKNOWN_POSITION
+        
+        # Clean price string (remove currency symbols)
+        cleaned = ''.join(c for c in str(competitor_price_str) if c.isdigit() or c == '.')
+        if not cleaned:
+            return _UNKNOWN_POSITION
+        
+        try:
+            competitor_price = float(cleaned)
+        except ValueError:
+            return _UNKNOWN_POSITION
+        
+        if competitor_price <= 0:
+            return _UNKNOWN_POSITION
+        
+        price_diff_percent = ((your_price - competitor_price) / competitor_price) * 100
+        position = "premium" if price_diff_percent > 5 else "discount" if price_diff_percent < -5 else "competitive"
+        return position, price_diff_percent
+    
     # =========================================================================
     # STRATEGIST AGENT - Recommend optimal pricing
     # =========================================================================
@@ -284,7 +326,7 @@ End with a JSON block containing your final recommendation:
 ```"""
 
         full_response = ""
-        async for chunk in ai_clients.stream_gemini3(strategy_prompt, model=self.model):
+        async for chunk in coalesce_chunks(ai_clients.stream_gemini3(strategy_prompt, model=self.model)):
             if chunk.text and not chunk.is_final:
                 full_response += chunk.text
                 yield AgentMessage(
@@ -321,29 +363,30 @@ End with a JSON block containing your final recommendation:
         your_product: ProductInfo
     ) -> PricingRecommendation:
         """Parse the JSON recommendation from strategist response."""
+        # Find JSON block in response, else try to find raw JSON
+        json_str = extract_json_block(response)
+        if json_str is None:
+            match = _RECO_RE.search(response)
+            json_str = match.group() if match else ""
+        json_str = json_str.strip()
+        
+        # Cheap check before handing non-objects to the parser
+        if not json_str.startswith("{"):
+            logger.warning("Failed to parse recommendation JSON: no JSON object in response")
+            return self._fallback_recommendation(response, your_product)
+        
         try:
-            # Find JSON block in response
-            if "```json" in response:
-                json_str = response.split("```json")[1].split("```")[0]
-            elif "```" in response:
-                json_str = response.split("```")[1].split("```")[0]
-            else:
-                # Try to find raw JSON
-                match = re.search(r'\{[^{}]*"recommended_price"[^{}]*\}', response)
-                if match:
-                    json_str = match.group()
-                else:
-                    raise ValueError("No JSON found in response")
+            data = json_loads(json_str)
             
-            data = json.loads(json_str.strip())
+            raw_price = data.get("recommended_price", your_product.price)
+            recommended_price = raw_price if isinstance(raw_price, Decimal) else Decimal(str(raw_price))
             
-            recommended_price = Decimal(str(data.get("recommended_price", your_product.price)))
-            current_price = Decimal(str(your_product.price))
-            
-            if current_price > 0:
-                change_percent = float((recommended_price - current_price) / current_price * 100)
+            # Percentage comes straight from the parsed float; Decimal is only built for the stored price
+            cf = float(your_product.price)
+            if cf > 0:
+                change_percent = (float(raw_price) - cf) / cf * 100.0
             else:
-                change_percent = 0
+                change_percent = 0.0
             
             return PricingRecommendation(
                 recommended_price=recommended_price,
@@ -357,16 +400,23 @@ End with a JSON block containing your final recommendation:
             
         except Exception as e:
             logger.warning(f"Failed to parse recommendation JSON: {e}")
-            # Return a safe default
-            return PricingRecommendation(
-                recommended_price=your_product.price,
-                confidence=0.3,
-                reasoning=response,
-                price_change_percent=0,
-                strategy="maintain",
-                risk_level="medium",
-                key_factors=["Unable to parse AI recommendation"]
-            )
+            return self._fallback_recommendation(response, your_product)
+    
+    def _fallback_recommendation(
+        self,
+        response: str,
+        your_product: ProductInfo
+    ) -> PricingRecommendation:
+        """Safe default when the strategist response can't be parsed."""
+        return PricingRecommendation(
+            recommended_price=your_product.price,
+            confidence=0.3,
+            reasoning=response,
+            price_change_percent=0,
+            strategy="maintain",
+            risk_level="medium",
+            key_factors=["Unable to parse AI recommendation"]
+        )
     
     # =========================================================================
     # FULL ORCHESTRATION - Run all agents in sequence
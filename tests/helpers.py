@@ -0,0 +1,26 @@
+"""
+Shared mirrors of ai_clients helpers used by several agent test modules.
+
+Production modules import core.config, so the tests replicate these small
+helpers instead; keeping one copy here stops the per-module copies drifting.
+"""
+
+try:
+    # Same optional loader as ai_clients, so the mirrors parse like production
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+
+def extract_json_block(text):
+    """Mirror of ai_clients.extract_json_block."""
+    start = text.find("```")
+    if start == -1:
+        return None
+    if text.startswith("json", start + 3):
+        start += 7
+    else:
+        json_start = text.find("```json", start)
+        start = json_start + 7 if json_start != -1 else start + 3
+    end = text.find("```", start)
+    return text[start:end] if end != -1 else text[start:]
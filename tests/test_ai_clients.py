@@ -5,9 +5,14 @@ Tests the keyword-based thought type classifier and thought signature
 extraction logic. These are pure functions with no API dependency.
 """
 
+import asyncio
 import pytest
-from unittest.mock import MagicMock
+from types import SimpleNamespace as NS
+from dataclasses import dataclass
 from enum import Enum
+from typing import Optional
+
+from .helpers import extract_json_block as _extract_json_block
 
 
 # ── Replicate ThoughtType locally so tests don't need full import chain ──
@@ -19,20 +24,30 @@ class ThoughtType(str, Enum):
     RECOMMENDATION = "recommendation"
 
 
+@dataclass
+class StreamChunk:
+    text: str
+    thought_type: Optional[ThoughtType] = None
+    is_final: bool = False
+    is_thought: bool = False
+
+
+_THOUGHT_KEYWORDS = (
+    (ThoughtType.OBSERVATION, ("i see", "looking at", "observing", "notice", "scanning")),
+    (ThoughtType.ANALYSIS, ("analyzing", "comparing", "examining", "this means", "evaluating")),
+    (ThoughtType.HYPOTHESIS, ("could be", "might", "possibly", "hypothesis", "if we")),
+    (ThoughtType.DECISION, ("therefore", "conclude", "decision", "determined", "verdict")),
+    (ThoughtType.RECOMMENDATION, ("recommend", "suggest", "should", "optimal", "strategy")),
+)
+
+
 def _detect_thought_type(text: str):
     """Mirror of ai_clients._detect_thought_type for isolated testing."""
     text_lower = text.lower()
 
-    if any(w in text_lower for w in ["i see", "looking at", "observing", "notice", "scanning"]):
-        return ThoughtType.OBSERVATION
-    elif any(w in text_lower for w in ["analyzing", "comparing", "examining", "this means", "evaluating"]):
-        return ThoughtType.ANALYSIS
-    elif any(w in text_lower for w in ["could be", "might", "possibly", "hypothesis", "if we"]):
-        return ThoughtType.HYPOTHESIS
-    elif any(w in text_lower for w in ["therefore", "conclude", "decision", "determined", "verdict"]):
-        return ThoughtType.DECISION
-    elif any(w in text_lower for w in ["recommend", "suggest", "should", "optimal", "strategy"]):
-        return ThoughtType.RECOMMENDATION
+    for thought_type, keywords in _THOUGHT_KEYWORDS:
+        if any(w in text_lower for w in keywords):
+            return thought_type
 
     return None
 
@@ -40,13 +55,65 @@ def _detect_thought_type(text: str):
 def _extract_thought_from_chunk(chunk):
     """Mirror of ai_clients._extract_thought_from_chunk for isolated testing."""
     try:
-        for candidate in getattr(chunk, "candidates", []):
-            for part in getattr(candidate.content, "parts", []):
-                if getattr(part, "thought", False):
+        for candidate in chunk.candidates:
+            for part in candidate.content.parts:
+                if part.thought:
                     return True
         return False
-    except Exception:
-        return None
+    except (AttributeError, TypeError):
+        return False
+
+
+_CHUNK_BOUNDARIES = ("\n", ".", "!", "?")
+
+
+async def coalesce_chunks(stream, min_chars=32):
+    """Mirror of ai_clients.coalesce_chunks for isolated testing."""
+    parts = []
+    size = 0
+    thought_type = None
+    is_thought = False
+
+    def merged():
+        return StreamChunk(text="".join(parts), thought_type=thought_type, is_thought=is_thought)
+
+    async for chunk in stream:
+        if chunk.is_final:
+            if parts:
+                yield merged()
+                parts, size, thought_type = [], 0, None
+            yield chunk
+            continue
+        if not chunk.text:
+            continue
+
+        if parts and chunk.is_thought != is_thought:
+            yield merged()
+            parts, size, thought_type = [], 0, None
+
+        parts.append(chunk.text)
+        size += len(chunk.text)
+        thought_type = chunk.thought_type or thought_type
+        is_thought = chunk.is_thought
+
+        if size >= min_chars or chunk.text.endswith(_CHUNK_BOUNDARIES):
+            yield merged()
+            parts, size, thought_type = [], 0, None
+
+    if parts:
+        yield merged()
+
+
+def _coalesce(chunks, min_chars=32):
+    """Run coalesce_chunks over a list of chunks and collect the output."""
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    async def collect():
+        return [c async for c in coalesce_chunks(stream(), min_chars)]
+
+    return asyncio.run(collect())
 
 
 # ═════════════════════════════════════════════════════════════════════════
@@ -163,57 +230,34 @@ class TestExtractThoughtFromChunk:
 
     def test_thought_true(self):
         """Chunk with part.thought=True should return True."""
-        part = MagicMock()
-        part.thought = True
-        content = MagicMock()
-        content.parts = [part]
-        candidate = MagicMock()
-        candidate.content = content
-        chunk = MagicMock()
-        chunk.candidates = [candidate]
+        part = NS(thought=True)
+        chunk = NS(candidates=[NS(content=NS(parts=[part]))])
 
         assert _extract_thought_from_chunk(chunk) is True
 
     def test_thought_false(self):
         """Chunk with part.thought=False should return False."""
-        part = MagicMock()
-        part.thought = False
-        content = MagicMock()
-        content.parts = [part]
-        candidate = MagicMock()
-        candidate.content = content
-        chunk = MagicMock()
-        chunk.candidates = [candidate]
+        part = NS(thought=False)
+        chunk = NS(candidates=[NS(content=NS(parts=[part]))])
 
         assert _extract_thought_from_chunk(chunk) is False
 
     def test_no_candidates(self):
         """Chunk with no candidates should return False."""
-        chunk = MagicMock()
-        chunk.candidates = []
+        chunk = NS(candidates=[])
 
         assert _extract_thought_from_chunk(chunk) is False
 
     def test_no_parts(self):
         """Chunk with empty parts should return False."""
-        content = MagicMock()
-        content.parts = []
-        candidate = MagicMock()
-        candidate.content = content
-        chunk = MagicMock()
-        chunk.candidates = [candidate]
+        chunk = NS(candidates=[NS(content=NS(parts=[]))])
 
         assert _extract_thought_from_chunk(chunk) is False
 
     def test_no_thought_attribute(self):
         """Part without thought attribute should return False."""
-        part = MagicMock(spec=[])  # No attributes
-        content = MagicMock()
-        content.parts = [part]
-        candidate = MagicMock()
-        candidate.content = content
-        chunk = MagicMock()
-        chunk.candidates = [candidate]
+        part = NS()  # No attributes
+        chunk = NS(candidates=[NS(content=NS(parts=[part]))])
 
         assert _extract_thought_from_chunk(chunk) is False
 
@@ -224,36 +268,101 @@ class TestExtractThoughtFromChunk:
 
     def test_multiple_parts_one_thought(self):
         """If any part has thought=True, return True."""
-        part1 = MagicMock()
-        part1.thought = False
-        part2 = MagicMock()
-        part2.thought = True
-        content = MagicMock()
-        content.parts = [part1, part2]
-        candidate = MagicMock()
-        candidate.content = content
-        chunk = MagicMock()
-        chunk.candidates = [candidate]
+        part1 = NS(thought=False)
+        part2 = NS(thought=True)
+        chunk = NS(candidates=[NS(content=NS(parts=[part1, part2]))])
 
         assert _extract_thought_from_chunk(chunk) is True
 
+    def test_none_candidates_returns_false(self):
+        """The SDK leaves candidates as None on some chunks."""
+        assert _extract_thought_from_chunk(NS(candidates=None)) is False
+
+    def test_none_content_returns_false(self):
+        chunk = NS(candidates=[NS(content=None)])
+        assert _extract_thought_from_chunk(chunk) is False
+
     def test_multiple_candidates(self):
         """First candidate with thought=True should return True."""
-        part1 = MagicMock()
-        part1.thought = False
-        content1 = MagicMock()
-        content1.parts = [part1]
-        cand1 = MagicMock()
-        cand1.content = content1
-
-        part2 = MagicMock()
-        part2.thought = True
-        content2 = MagicMock()
-        content2.parts = [part2]
-        cand2 = MagicMock()
-        cand2.content = content2
-
-        chunk = MagicMock()
-        chunk.candidates = [cand1, cand2]
+        cand1 = NS(content=NS(parts=[NS(thought=False)]))
+        cand2 = NS(content=NS(parts=[NS(thought=True)]))
+        chunk = NS(candidates=[cand1, cand2])
 
         assert _extract_thought_from_chunk(chunk) is True
+
+
+# ═════════════════════════════════════════════════════════════════════════
+# JSON BLOCK EXTRACTION TESTS
+# ═════════════════════════════════════════════════════════════════════════
+
+
+class TestExtractJsonBlock:
+    """Test fenced JSON extraction shared by the agent parsers."""
+
+    def test_json_fence(self):
+        text = 'Analysis first.\n```json\n{"a": 1}\n```\nTrailing text.'
+        assert _extract_json_block(text).strip() == '{"a": 1}'
+
+    def test_bare_fence(self):
+        assert _extract_json_block('```\n{"a": 1}\n```').strip() == '{"a": 1}'
+
+    def test_json_fence_preferred_over_bare_fence(self):
+        text = '```\nnot json\n```\n```json\n{"a": 1}\n```'
+        assert _extract_json_block(text).strip() == '{"a": 1}'
+
+    def test_first_json_block_wins(self):
+        text = '```json\n{"a": 1}\n```\n```json\n{"a": 2}\n```'
+        assert _extract_json_block(text).strip() == '{"a": 1}'
+
+    def test_unterminated_fence_takes_remainder(self):
+        assert _extract_json_block('```json\n{"a": 1}').strip() == '{"a": 1}'
+
+    def test_no_fence_returns_none(self):
+        assert _extract_json_block('{"a": 1}') is None
+
+    def test_empty_text_returns_none(self):
+        assert _extract_json_block("") is None
+
+
+# ═════════════════════════════════════════════════════════════════════════
+# STREAM COALESCING TESTS
+# ═════════════════════════════════════════════════════════════════════════
+
+
+class TestCoalesceChunks:
+    """Test batching of small streamed chunks into larger messages."""
+
+    def test_merges_small_chunks_until_boundary(self):
+        chunks = [StreamChunk("I "), StreamChunk("see "), StreamChunk("a price."), StreamChunk("", is_final=True)]
+        out = _coalesce(chunks)
+        assert [c.text for c in out] == ["I see a price.", ""]
+        assert out[-1].is_final
+
+    def test_flushes_at_min_chars(self):
+        chunks = [StreamChunk("abcd"), StreamChunk("efgh"), StreamChunk("ij")]
+        out = _coalesce(chunks, min_chars=8)
+        assert [c.text for c in out] == ["abcdefgh", "ij"]
+
+    def test_final_chunk_flushes_buffer(self):
+        chunks = [StreamChunk("partial"), StreamChunk("Error: boom", is_final=True)]
+        out = _coalesce(chunks)
+        assert [(c.text, c.is_final) for c in out] == [("partial", False), ("Error: boom", True)]
+
+    def test_thought_and_answer_text_not_merged(self):
+        chunks = [StreamChunk("thinking ", is_thought=True), StreamChunk("answer")]
+        out = _coalesce(chunks)
+        assert [(c.text, c.is_thought) for c in out] == [("thinking ", True), ("answer", False)]
+
+    def test_keeps_latest_thought_type(self):
+        chunks = [
+            StreamChunk("I see ", thought_type=ThoughtType.OBSERVATION),
+            StreamChunk("so "),
+            StreamChunk("I recommend it.", thought_type=ThoughtType.RECOMMENDATION),
+        ]
+        out = _coalesce(chunks)
+        assert len(out) == 1
+        assert out[0].thought_type == ThoughtType.RECOMMENDATION
+
+    def test_skips_empty_text(self):
+        chunks = [StreamChunk(""), StreamChunk("done.")]
+        assert [c.text for c in _coalesce(chunks)] == ["done."]
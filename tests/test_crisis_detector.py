@@ -7,11 +7,15 @@ No Gemini API dependency.
 
 import pytest
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from dataclasses import dataclass, field
+from bisect import bisect_left
+from operator import attrgetter, itemgetter
 from typing import Optional, List
 from enum import Enum
 
+from .helpers import extract_json_block as _extract_json_block, json_loads
+
 
 # ── Local replicas of data classes for isolated testing ──
 
@@ -23,7 +27,18 @@ class CrisisSeverity(str, Enum):
     CRITICAL = "critical"
 
 
-@dataclass
+_SENTIMENT_SEVERITY_THRESHOLDS = (0.1, 0.2, 0.4, 0.6)
+_VOLUME_SEVERITY_THRESHOLDS = (0.5, 1.5, 3, 5)
+_SEVERITY_LEVELS = (
+    CrisisSeverity.NONE,
+    CrisisSeverity.LOW,
+    CrisisSeverity.MEDIUM,
+    CrisisSeverity.HIGH,
+    CrisisSeverity.CRITICAL,
+)
+
+
+@dataclass(slots=True)
 class SentimentDataPoint:
     timestamp: datetime
     score: float
@@ -32,6 +47,69 @@ class SentimentDataPoint:
     sample_text: Optional[str] = None
 
 
+_BY_TIMESTAMP = attrgetter("timestamp")
+
+
+@dataclass(slots=True)
+class SentimentBatch:
+    timestamps: list
+    scores: list
+    volumes: list
+    sources: list
+    sample_texts: list
+
+    def __len__(self):
+        return len(self.scores)
+
+    @classmethod
+    def from_points(cls, points, assume_sorted=False):
+        ordered = points if assume_sorted else sorted(points, key=_BY_TIMESTAMP)
+        return cls(
+            timestamps=list(map(_BY_TIMESTAMP, ordered)),
+            scores=list(map(attrgetter("score"), ordered)),
+            volumes=list(map(attrgetter("volume"), ordered)),
+            sources=list(map(attrgetter("source"), ordered)),
+            sample_texts=list(map(attrgetter("sample_text"), ordered)),
+        )
+
+    def to_points(self):
+        return list(map(
+            SentimentDataPoint,
+            self.timestamps, self.scores, self.volumes, self.sources, self.sample_texts
+        ))
+
+
+_ROW_FIELDS = attrgetter("timestamp", "score", "volume", "source", "sample_text")
+
+
+_SUMMARY_ROW = "[%s] Score: %.2f (%s%.2f) | Volume: %s mentions | Source: %s"
+_SUMMARY_SAMPLE = '  Sample: "%.100s..."'
+
+
+def _as_batch(data):
+    if isinstance(data, SentimentBatch):
+        return data
+    return SentimentBatch.from_points(data)
+
+
+def _anomaly_kernel(scores, volumes):
+    midpoint = len(scores) // 2
+    old_scores = scores[:midpoint] if midpoint > 0 else scores
+    recent_scores = scores[midpoint:] if midpoint > 0 else scores
+    old_volumes = volumes[:midpoint] if midpoint > 0 else volumes
+    recent_volumes = volumes[midpoint:] if midpoint > 0 else volumes
+
+    old_sentiment = sum(old_scores) / len(old_scores)
+    recent_sentiment = sum(recent_scores) / len(recent_scores)
+    old_volume = sum(old_volumes) / len(old_volumes)
+    recent_volume = sum(recent_volumes) / len(recent_volumes)
+
+    sentiment_change = (recent_sentiment - old_sentiment) / max(abs(old_sentiment), 0.1)
+    volume_change = (recent_volume - old_volume) / max(old_volume, 1)
+
+    return sentiment_change, volume_change, recent_sentiment, scores.index(min(scores))
+
+
 # ── Helper methods extracted from CrisisDetector for isolated testing ──
 
 SENTIMENT_DROP_THRESHOLD = -0.2
@@ -39,28 +117,18 @@ VOLUME_SPIKE_THRESHOLD = 2.0
 
 
 def _calculate_anomaly_metrics(data, baseline):
-    if not data:
+    batch = _as_batch(data)
+    scores = batch.scores
+    if not scores:
         return False, {
             'sentiment_change': 0,
             'volume_change': 0,
             'current_sentiment': baseline
         }
 
-    sorted_data = sorted(data, key=lambda x: x.timestamp)
-    midpoint = len(sorted_data) // 2
-    old_data = sorted_data[:midpoint] if midpoint > 0 else sorted_data
-    recent_data = sorted_data[midpoint:] if midpoint > 0 else sorted_data
-
-    old_sentiment = sum(d.score for d in old_data) / len(old_data) if old_data else baseline
-    recent_sentiment = sum(d.score for d in recent_data) / len(recent_data) if recent_data else baseline
-
-    old_volume = sum(d.volume for d in old_data) / len(old_data) if old_data else 1
-    recent_volume = sum(d.volume for d in recent_data) / len(recent_data) if recent_data else 1
-
-    sentiment_change = (recent_sentiment - old_sentiment) / max(abs(old_sentiment), 0.1)
-    volume_change = (recent_volume - old_volume) / max(old_volume, 1)
-
-    most_negative = min(data, key=lambda x: x.score)
+    sentiment_change, volume_change, recent_sentiment, peak_idx = _anomaly_kernel(
+        scores, batch.volumes
+    )
 
     anomaly_detected = (
         sentiment_change < SENTIMENT_DROP_THRESHOLD or
@@ -71,8 +139,8 @@ def _calculate_anomaly_metrics(data, baseline):
         'sentiment_change': sentiment_change,
         'volume_change': volume_change,
         'current_sentiment': recent_sentiment,
-        'peak_negative_time': most_negative.timestamp.isoformat(),
-        'peak_negative_score': most_negative.score
+        'peak_negative_time': batch.timestamps[peak_idx].isoformat(),
+        'peak_negative_score': scores[peak_idx]
     }
 
 
@@ -80,57 +148,76 @@ def _assess_severity(monitoring_result):
     sentiment_change = abs(monitoring_result.get('sentiment_change', 0))
     volume_change = monitoring_result.get('volume_change', 0)
 
-    if sentiment_change > 0.6 or volume_change > 5:
-        return CrisisSeverity.CRITICAL
-    elif sentiment_change > 0.4 or volume_change > 3:
-        return CrisisSeverity.HIGH
-    elif sentiment_change > 0.2 or volume_change > 1.5:
-        return CrisisSeverity.MEDIUM
-    elif sentiment_change > 0.1 or volume_change > 0.5:
-        return CrisisSeverity.LOW
+    level = max(
+        bisect_left(_SENTIMENT_SEVERITY_THRESHOLDS, sentiment_change),
+        bisect_left(_VOLUME_SEVERITY_THRESHOLDS, volume_change),
+    )
+    return _SEVERITY_LEVELS[level]
+
+
+def _get_negative_samples(data, limit=20):
+    if isinstance(data, SentimentBatch):
+        negative = [
+            row for row in zip(data.sources, data.scores, data.sample_texts)
+            if row[1] < 0 and row[2]
+        ]
     else:
-        return CrisisSeverity.NONE
+        negative = [
+            (d.source, d.score, d.sample_text) for d in data
+            if d.score < 0 and d.sample_text
+        ]
+    negative.sort(key=itemgetter(1))
+    if not negative:
+        return "No negative samples available"
+    samples = []
+    for source, score, sample_text in negative[:limit]:
+        samples.append(f'[{source}] Score: {score:.2f}\n"{sample_text}"')
+    return "\n\n".join(samples)
 
 
 def _get_affected_sources(data):
-    source_scores = {}
-    for d in data:
-        if d.source not in source_scores:
-            source_scores[d.source] = []
-        source_scores[d.source].append(d.score)
-    return [
-        source for source, scores in source_scores.items()
-        if sum(scores) / len(scores) < 0
-    ]
+    source_totals = {}
+    if isinstance(data, SentimentBatch):
+        for source, score in zip(data.sources, data.scores):
+            source_totals[source] = source_totals.get(source, 0.0) + score
+    else:
+        for d in data:
+            source_totals[d.source] = source_totals.get(d.source, 0.0) + d.score
+    return [source for source, total in source_totals.items() if total < 0]
+
+
+def _default_response_plan():
+    return {"crisis_title": "Crisis Response Plan", "immediate_actions": []}
 
 
 def _parse_response_json(response):
+    json_str = (_extract_json_block(response) or "").strip()
+    if not json_str.startswith("{"):
+        return _default_response_plan()
     try:
-        if "```json" in response:
-            json_str = response.split("```json")[1].split("```")[0]
-        elif "```" in response:
-            json_str = response.split("```")[1].split("```")[0]
-        else:
-            return {"crisis_title": "Crisis Response Plan", "immediate_actions": []}
-        return json.loads(json_str.strip())
+        return json_loads(json_str)
     except Exception:
-        return {"crisis_title": "Crisis Response Plan", "immediate_actions": []}
+        return _default_response_plan()
 
 
 def _prepare_data_summary(data, baseline):
-    if not data:
+    if not len(data):
         return "No data available"
+    if isinstance(data, SentimentBatch):
+        rows = zip(
+            data.timestamps[-50:], data.scores[-50:], data.volumes[-50:],
+            data.sources[-50:], data.sample_texts[-50:]
+        )
+    else:
+        rows = map(_ROW_FIELDS, sorted(data, key=_BY_TIMESTAMP)[-50:])
     lines = []
-    for dp in sorted(data, key=lambda x: x.timestamp)[-50:]:
-        time_str = dp.timestamp.strftime("%Y-%m-%d %H:%M")
-        diff = dp.score - baseline
+    for ts, score, volume, source, sample_text in rows:
+        time_str = ts.isoformat(" ", "minutes")[:16]
+        diff = score - baseline
         direction = "↑" if diff > 0 else "↓" if diff < 0 else "→"
-        lines.append(
-            f"[{time_str}] Score: {dp.score:.2f} ({direction}{abs(diff):.2f}) | "
-            f"Volume: {dp.volume} mentions | Source: {dp.source}"
-        )
-        if dp.sample_text:
-            lines.append(f'  Sample: "{dp.sample_text[:100]}..."')
+        lines.append(_SUMMARY_ROW % (time_str, score, direction, abs(diff), volume, source))
+        if sample_text:
+            lines.append(_SUMMARY_SAMPLE % sample_text)
     return "\n".join(lines)
 
 
@@ -138,7 +225,7 @@ def _prepare_data_summary(data, baseline):
 # FIXTURES
 # ═════════════════════════════════════════════════════════════════════════
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def stable_sentiment():
     """Stable sentiment data — no anomaly."""
     base = datetime(2026, 2, 1, 12, 0)
@@ -148,7 +235,7 @@ def stable_sentiment():
     ]
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def crisis_sentiment():
     """Sentiment data showing a clear crisis — sharp drop + volume spike."""
     base = datetime(2026, 2, 1, 12, 0)
@@ -165,7 +252,7 @@ def crisis_sentiment():
     return old + recent
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def mixed_sources():
     """Data across multiple sources with mixed sentiment."""
     base = datetime(2026, 2, 1, 12, 0)
@@ -211,6 +298,32 @@ class TestCalculateAnomalyMetrics:
         detected, metrics = _calculate_anomaly_metrics(data, 0.5)
         assert metrics['current_sentiment'] == -0.5
 
+    def test_unsorted_input_split_by_time(self):
+        """Halves are taken in time order, not input order."""
+        base = datetime(2026, 2, 1)
+        data = [
+            SentimentDataPoint(base + timedelta(hours=3), score=-0.8, volume=50, source="reddit"),
+            SentimentDataPoint(base, score=0.6, volume=10, source="twitter"),
+            SentimentDataPoint(base + timedelta(hours=2), score=-0.8, volume=50, source="reddit"),
+            SentimentDataPoint(base + timedelta(hours=1), score=0.6, volume=10, source="twitter"),
+        ]
+        detected, metrics = _calculate_anomaly_metrics(data, 0.5)
+        assert detected is True
+        assert metrics['current_sentiment'] == pytest.approx(-0.8)
+        assert metrics['volume_change'] == pytest.approx(4.0)
+        assert metrics['peak_negative_time'] == (base + timedelta(hours=2)).isoformat()
+
+    def test_accepts_batch(self, crisis_sentiment):
+        """A shared sorted batch gives the same result as the raw list."""
+        batch = SentimentBatch.from_points(crisis_sentiment)
+        assert _calculate_anomaly_metrics(batch, 0.5) == _calculate_anomaly_metrics(crisis_sentiment, 0.5)
+        assert _prepare_data_summary(batch, 0.5) == _prepare_data_summary(crisis_sentiment, 0.5)
+
+    def test_empty_batch_no_anomaly(self):
+        detected, metrics = _calculate_anomaly_metrics(SentimentBatch.from_points([]), 0.5)
+        assert detected is False
+        assert _prepare_data_summary(SentimentBatch.from_points([]), 0.5) == "No data available"
+
     def test_volume_spike_triggers_anomaly(self):
         """Volume spike alone should trigger anomaly."""
         base = datetime(2026, 2, 1)
@@ -225,6 +338,27 @@ class TestCalculateAnomalyMetrics:
         assert metrics['volume_change'] > VOLUME_SPIKE_THRESHOLD
 
 
+class TestAnomalyKernel:
+
+    def test_halves_compared(self):
+        change, vol_change, recent, peak = _anomaly_kernel([0.5, 0.5, -0.5, -0.5], [10, 10, 30, 30])
+        assert change == pytest.approx(-2.0)
+        assert vol_change == pytest.approx(2.0)
+        assert recent == pytest.approx(-0.5)
+        assert peak == 2
+
+    def test_single_point_compares_to_itself(self):
+        assert _anomaly_kernel([-0.4], [7]) == (0.0, 0.0, -0.4, 0)
+
+    def test_odd_length_puts_extra_point_in_recent_half(self):
+        _, _, recent, _ = _anomaly_kernel([0.0, 0.3, 0.6], [1, 1, 1])
+        assert recent == pytest.approx(0.45)
+
+    def test_small_old_sentiment_denominator_floored(self):
+        change, _, _, _ = _anomaly_kernel([0.0, -0.2], [1, 1])
+        assert change == pytest.approx(-2.0)
+
+
 # ═════════════════════════════════════════════════════════════════════════
 # SEVERITY ASSESSMENT TESTS
 # ═════════════════════════════════════════════════════════════════════════
@@ -266,6 +400,27 @@ class TestAssessSeverity:
         """Negative sentiment_change should use absolute value."""
         assert _assess_severity({'sentiment_change': -0.7, 'volume_change': 0}) == CrisisSeverity.CRITICAL
 
+    @pytest.mark.parametrize("sentiment_change, expected", [
+        (0.1, CrisisSeverity.NONE),
+        (-0.2, CrisisSeverity.LOW),
+        (0.4, CrisisSeverity.MEDIUM),
+        (-0.6, CrisisSeverity.HIGH),
+    ])
+    def test_sentiment_cutoffs_are_exclusive(self, sentiment_change, expected):
+        assert _assess_severity({'sentiment_change': sentiment_change}) == expected
+
+    @pytest.mark.parametrize("volume_change, expected", [
+        (0.5, CrisisSeverity.NONE),
+        (1.5, CrisisSeverity.LOW),
+        (3, CrisisSeverity.MEDIUM),
+        (5, CrisisSeverity.HIGH),
+    ])
+    def test_volume_cutoffs_are_exclusive(self, volume_change, expected):
+        assert _assess_severity({'volume_change': volume_change}) == expected
+
+    def test_higher_of_the_two_levels_wins(self):
+        assert _assess_severity({'sentiment_change': -0.15, 'volume_change': 4}) == CrisisSeverity.HIGH
+
 
 # ═════════════════════════════════════════════════════════════════════════
 # AFFECTED SOURCES TESTS
@@ -302,6 +457,90 @@ class TestGetAffectedSources:
         assert "twitter" in affected
         assert "reddit" in affected
 
+    def test_zero_average_not_affected(self):
+        data = [
+            SentimentDataPoint(datetime.now(), score=-0.5, volume=10, source="twitter"),
+            SentimentDataPoint(datetime.now(), score=0.5, volume=10, source="twitter"),
+        ]
+        assert _get_affected_sources(data) == []
+
+    def test_preserves_first_seen_order(self):
+        data = [
+            SentimentDataPoint(datetime.now(), score=-0.2, volume=10, source="reddit"),
+            SentimentDataPoint(datetime.now(), score=-0.4, volume=10, source="twitter"),
+            SentimentDataPoint(datetime.now(), score=-0.1, volume=10, source="reddit"),
+        ]
+        assert _get_affected_sources(data) == ["reddit", "twitter"]
+
+
+class TestGetNegativeSamples:
+
+    def test_most_negative_first(self):
+        data = [
+            SentimentDataPoint(datetime(2026, 2, 1), score=-0.2, volume=1, source="reddit", sample_text="meh"),
+            SentimentDataPoint(datetime(2026, 2, 2), score=-0.9, volume=1, source="twitter", sample_text="awful"),
+            SentimentDataPoint(datetime(2026, 2, 3), score=0.4, volume=1, source="news", sample_text="fine"),
+        ]
+        result = _get_negative_samples(data)
+        assert result == '[twitter] Score: -0.90\n"awful"\n\n[reddit] Score: -0.20\n"meh"'
+
+    def test_skips_points_without_text(self):
+        data = [SentimentDataPoint(datetime(2026, 2, 1), score=-0.5, volume=1, source="reddit")]
+        assert _get_negative_samples(data) == "No negative samples available"
+
+    def test_respects_limit(self):
+        data = [
+            SentimentDataPoint(datetime(2026, 2, 1), score=-0.1 * i, volume=1, source="x", sample_text=str(i))
+            for i in range(1, 6)
+        ]
+        assert _get_negative_samples(data, limit=2).count("Score:") == 2
+
+
+# ═════════════════════════════════════════════════════════════════════════
+# SENTIMENT BATCH TESTS
+# ═════════════════════════════════════════════════════════════════════════
+
+
+class TestSentimentBatch:
+
+    def test_from_points_sorts_by_time(self):
+        base = datetime(2026, 2, 1)
+        data = [
+            SentimentDataPoint(base + timedelta(hours=2), score=-0.4, volume=3, source="news"),
+            SentimentDataPoint(base, score=0.2, volume=1, source="twitter", sample_text="ok"),
+        ]
+        batch = SentimentBatch.from_points(data)
+        assert batch.timestamps == [base, base + timedelta(hours=2)]
+        assert batch.scores == [0.2, -0.4]
+        assert batch.sources == ["twitter", "news"]
+        assert batch.sample_texts == ["ok", None]
+        assert len(batch) == 2
+
+    def test_round_trip(self, crisis_sentiment):
+        batch = SentimentBatch.from_points(crisis_sentiment)
+        assert batch.to_points() == sorted(crisis_sentiment, key=lambda x: x.timestamp)
+
+    def test_helpers_agree_with_point_lists(self, mixed_sources):
+        batch = SentimentBatch.from_points(mixed_sources)
+        assert sorted(_get_affected_sources(batch)) == sorted(_get_affected_sources(mixed_sources))
+        assert _get_negative_samples(batch) == _get_negative_samples(batch.to_points())
+
+    def test_assume_sorted_skips_sort(self, crisis_sentiment):
+        """Fixtures are built in time order, so both paths agree."""
+        assert SentimentBatch.from_points(crisis_sentiment, assume_sorted=True) == SentimentBatch.from_points(crisis_sentiment)
+
+    def test_assume_sorted_keeps_input_order(self):
+        base = datetime(2026, 2, 1)
+        data = [
+            SentimentDataPoint(base + timedelta(hours=1), score=0.1, volume=1, source="a"),
+            SentimentDataPoint(base, score=0.2, volume=1, source="b"),
+        ]
+        assert SentimentBatch.from_points(data, assume_sorted=True).sources == ["a", "b"]
+
+    def test_as_batch_passes_batch_through(self, stable_sentiment):
+        batch = SentimentBatch.from_points(stable_sentiment)
+        assert _as_batch(batch) is batch
+
 
 # ═════════════════════════════════════════════════════════════════════════
 # JSON PARSING TESTS
@@ -351,6 +590,18 @@ That concludes my assessment.'''
         result = _parse_response_json(response)
         assert result["crisis_title"] == "Crisis Response Plan"
 
+    @pytest.mark.skipif(json_loads is json.loads, reason="stdlib json accepts NaN and 1e999")
+    @pytest.mark.parametrize("value", ["NaN", "1e999"])
+    def test_non_finite_number_returns_default(self, value):
+        response = '```json\n{"crisis_title": "Recall", "risk": ' + value + '}\n```'
+        result = _parse_response_json(response)
+        assert result["crisis_title"] == "Crisis Response Plan"
+
+    def test_deeply_nested_json_returns_default(self):
+        response = "```json\n{\"a\": " + "[" * 100000 + "\n```"
+        result = _parse_response_json(response)
+        assert result["crisis_title"] == "Crisis Response Plan"
+
     def test_empty_response(self):
         result = _parse_response_json("")
         assert result["crisis_title"] == "Crisis Response Plan"
@@ -367,6 +618,27 @@ That concludes my assessment.'''
         assert result["crisis_title"] == "Social Media Storm"
         assert result["long_term"]["strategy"] == "rebrand"
 
+    def test_json_fence_preferred_over_earlier_bare_fence(self):
+        response = 'Example:\n```\nnot json\n```\n```json\n{"crisis_title": "Recall"}\n```'
+        assert _parse_response_json(response)["crisis_title"] == "Recall"
+
+    def test_unterminated_fence(self):
+        response = '```json\n{"crisis_title": "Truncated", "immediate_actions": []}'
+        assert _parse_response_json(response)["crisis_title"] == "Truncated"
+
+    def test_non_object_block_returns_default(self):
+        """Fenced prose or a bare JSON array is not a response plan."""
+        assert _parse_response_json("```\nJust some notes\n```")["crisis_title"] == "Crisis Response Plan"
+        assert _parse_response_json('```json\n["a", "b"]\n```')["immediate_actions"] == []
+
+    def test_empty_fence_returns_default(self):
+        assert _parse_response_json("```json\n```")["crisis_title"] == "Crisis Response Plan"
+
+    def test_default_is_fresh_each_call(self):
+        first = _parse_response_json("")
+        first["immediate_actions"].append("mutated")
+        assert _parse_response_json("")["immediate_actions"] == []
+
 
 # ═════════════════════════════════════════════════════════════════════════
 # DATA PREPARATION TESTS
@@ -427,3 +699,23 @@ class TestPrepareDataSummary:
         result = _prepare_data_summary(data, 0.0)
         # Sample should be truncated to 100 chars + "..."
         assert 'A"...' in result or "A..." in result
+
+    def test_row_format_exact(self):
+        data = [
+            SentimentDataPoint(
+                datetime(2026, 2, 1, 9, 5), score=-0.254, volume=12,
+                source="reddit", sample_text="B" * 120
+            )
+        ]
+        assert _prepare_data_summary(data, 0.1).split("\n") == [
+            "[2026-02-01 09:05] Score: -0.25 (↓0.35) | Volume: 12 mentions | Source: reddit",
+            '  Sample: "' + "B" * 100 + '..."',
+        ]
+
+    def test_aware_timestamp_has_no_offset(self):
+        data = [SentimentDataPoint(datetime(2026, 2, 1, 14, 30, 59, tzinfo=timezone.utc), score=0.1, volume=1, source="news")]
+        assert _prepare_data_summary(data, 0.0).startswith("[2026-02-01 14:30] ")
+
+    def test_zero_pads_date_fields(self):
+        data = [SentimentDataPoint(datetime(987, 3, 4, 5, 6), score=0.1, volume=1, source="news")]
+        assert "[0987-03-04 05:06]" in _prepare_data_summary(data, 0.0)
@@ -6,15 +6,20 @@ No Gemini API dependency.
 """
 
 import pytest
-import json
-from datetime import datetime, timedelta
+import sys
+from datetime import datetime, timedelta, timezone
 from dataclasses import dataclass, field
+from enum import Enum
+from heapq import nlargest
+from operator import attrgetter
 from typing import Optional, List
 
+from .helpers import extract_json_block as _extract_json_block, json_loads
+
 
 # ── Local replica of data classes ──
 
-@dataclass
+@dataclass(slots=True)
 class LaunchSignal:
     source: str
     content: str
@@ -24,26 +29,47 @@ class LaunchSignal:
     author: Optional[str] = None
     image_data: Optional[bytes] = None
     image_type: str = "png"
+    _content_lower: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if type(self.source) is str:
+            self.source = sys.intern(self.source)
+
+    @property
+    def content_lower(self):
+        if self._content_lower is None:
+            self._content_lower = self.content.lower()
+        return self._content_lower
 
 
 # ── Helper methods extracted from LaunchDetector ──
 
-LAUNCH_KEYWORDS = [
+LAUNCH_KEYWORDS = (
     "new product", "launching", "announcing", "introducing",
     "released", "unveiled", "debuting", "available now",
     "coming soon", "pre-order", "just dropped", "brand new"
-]
+)
+STRONG_INDICATORS = ("announcing", "introducing", "launching today", "now available")
 MIN_CONFIDENCE = 0.3
 
 
 def _analyze_scanner_response(response, signals):
     response_lower = response.lower()
 
-    keyword_matches = sum(1 for kw in LAUNCH_KEYWORDS if kw in response_lower)
-    signal_matches = sum(
-        1 for sig in signals
-        if any(kw in sig.content.lower() for kw in LAUNCH_KEYWORDS)
-    )
+    keyword_matches = 0
+    for kw in LAUNCH_KEYWORDS:
+        if kw in response_lower:
+            keyword_matches += 1
+            if keyword_matches == 3:
+                break
+
+    signal_matches = 0
+    for sig in signals:
+        content = sig.content_lower
+        if any(kw in content for kw in LAUNCH_KEYWORDS):
+            signal_matches += 1
+            if signal_matches == 2:
+                break
 
     base_confidence = 0.0
 
@@ -57,8 +83,7 @@ def _analyze_scanner_response(response, signals):
     elif signal_matches >= 1:
         base_confidence += 0.2
 
-    strong_indicators = ["announcing", "introducing", "launching today", "now available"]
-    if any(ind in response_lower for ind in strong_indicators):
+    if any(ind in response_lower for ind in STRONG_INDICATORS):
         base_confidence += 0.2
 
     confidence = min(base_confidence, 1.0)
@@ -67,8 +92,8 @@ def _analyze_scanner_response(response, signals):
     return launch_detected, confidence
 
 
-def _parse_validator_json(response):
-    default = {
+def _default_validation():
+    return {
         "is_confirmed_launch": False,
         "launch_type": "unknown",
         "confidence": 0,
@@ -78,21 +103,10 @@ def _parse_validator_json(response):
         "estimated_price": None,
         "launch_date": "TBD"
     }
-    try:
-        if "```json" in response:
-            json_str = response.split("```json")[1].split("```")[0]
-        elif "```" in response:
-            json_str = response.split("```")[1].split("```")[0]
-        else:
-            return default
-        parsed = json.loads(json_str.strip())
-        return {**default, **parsed}
-    except Exception:
-        return default
 
 
-def _parse_assessor_json(response):
-    default = {
+def _default_assessment():
+    return {
         "threat_level": "medium",
         "threat_score": 50,
         "urgency": "monitor",
@@ -102,17 +116,30 @@ def _parse_assessor_json(response):
         "strategic_actions": [],
         "monitoring_priorities": []
     }
+
+
+def _parse_validator_json(response):
+    result = _default_validation()
+    json_str = (_extract_json_block(response) or "").strip()
+    if not json_str.startswith("{"):
+        return result
+    try:
+        result.update(json_loads(json_str))
+    except Exception:
+        pass
+    return result
+
+
+def _parse_assessor_json(response):
+    result = _default_assessment()
+    json_str = (_extract_json_block(response) or "").strip()
+    if not json_str.startswith("{"):
+        return result
     try:
-        if "```json" in response:
-            json_str = response.split("```json")[1].split("```")[0]
-        elif "```" in response:
-            json_str = response.split("```")[1].split("```")[0]
-        else:
-            return default
-        parsed = json.loads(json_str.strip())
-        return {**default, **parsed}
+        result.update(json_loads(json_str))
     except Exception:
-        return default
+        pass
+    return result
 
 
 def _prepare_signal_summary(signals):
@@ -120,7 +147,7 @@ def _prepare_signal_summary(signals):
         return "No signals available"
     lines = []
     for i, sig in enumerate(signals[:20], 1):
-        timestamp = sig.timestamp.strftime("%Y-%m-%d %H:%M") if sig.timestamp else "Unknown time"
+        timestamp = sig.timestamp.isoformat(" ", "minutes")[:16] if sig.timestamp else "Unknown time"
         engagement = f" | Engagement: {sig.engagement}" if sig.engagement > 0 else ""
         author = f" | @{sig.author}" if sig.author else ""
         lines.append(f"[Signal {i}] [{sig.source.upper()}] {timestamp}{author}{engagement}")
@@ -132,13 +159,20 @@ def _prepare_signal_summary(signals):
 
 
 def _get_signal_sources(signals):
-    return list(set(sig.source for sig in signals))
+    return list(dict.fromkeys(sig.source for sig in signals))
+
+
+_BY_ENGAGEMENT = attrgetter("engagement")
+_HEAP_SELECT_MIN_SIGNALS = 200
 
 
 def _get_detailed_signals(signals, limit=5):
-    sorted_signals = sorted(signals, key=lambda x: x.engagement, reverse=True)
+    if len(signals) > _HEAP_SELECT_MIN_SIGNALS:
+        top_signals = nlargest(limit, signals, key=_BY_ENGAGEMENT)
+    else:
+        top_signals = sorted(signals, key=_BY_ENGAGEMENT, reverse=True)[:limit]
     lines = []
-    for sig in sorted_signals[:limit]:
+    for sig in top_signals:
         lines.append(f"=== [{sig.source.upper()}] ===")
         lines.append(sig.content)
         lines.append("")
@@ -195,6 +229,36 @@ def single_signal():
     ]
 
 
+# ═════════════════════════════════════════════════════════════════════════
+# LAUNCH SIGNAL TESTS
+# ═════════════════════════════════════════════════════════════════════════
+
+
+class TestLaunchSignal:
+
+    def test_source_interned(self):
+        built = "".join(["twit", "ter"])
+        assert LaunchSignal(source=built, content="a").source is LaunchSignal(source="twitter", content="b").source
+
+    def test_str_subclass_source_kept(self):
+        class Source(str, Enum):
+            TWITTER = "twitter"
+
+        sig = LaunchSignal(source=Source.TWITTER, content="a")
+        assert sig.source is Source.TWITTER
+        assert sig.source == "twitter"
+
+    def test_signal_has_no_instance_dict(self):
+        assert not hasattr(LaunchSignal(source="news", content="a"), "__dict__")
+
+    def test_cached_lowercase_not_part_of_equality(self):
+        a = LaunchSignal(source="twitter", content="Brand New")
+        b = LaunchSignal(source="twitter", content="Brand New")
+        _ = a.content_lower
+        assert a == b
+        assert "_content_lower" not in repr(a)
+
+
 # ═════════════════════════════════════════════════════════════════════════
 # SCANNER RESPONSE ANALYSIS TESTS
 # ═════════════════════════════════════════════════════════════════════════
@@ -261,6 +325,28 @@ class TestAnalyzeScannerResponse:
         assert detected is True
         assert confidence >= MIN_CONFIDENCE
 
+    def test_signal_content_lowered_once(self):
+        sig = LaunchSignal(source="twitter", content="Just Dropped: the X1")
+        _analyze_scanner_response("nothing", [sig])
+        assert sig._content_lower == "just dropped: the x1"
+        assert sig.content_lower is sig._content_lower
+
+    def test_stops_scanning_signals_after_two_matches(self):
+        signals = [
+            LaunchSignal(source="twitter", content="Launching the X1"),
+            LaunchSignal(source="reddit", content="pre-order is open"),
+            LaunchSignal(source="news", content="Brand new colours"),
+        ]
+        _, confidence = _analyze_scanner_response("no keywords here", signals)
+        assert confidence == pytest.approx(0.4)
+        assert signals[2]._content_lower is None
+
+    def test_many_keywords_same_score_as_three(self, boring_signals):
+        three = "new product, launching, released"
+        many = "new product, launching, released, unveiled, debuting, brand new"
+        assert _analyze_scanner_response(three, boring_signals) == _analyze_scanner_response(many, boring_signals)
+
+
 
 # ═════════════════════════════════════════════════════════════════════════
 # VALIDATOR JSON PARSING TESTS
@@ -331,6 +417,24 @@ This is a high-confidence detection.'''
         result = _parse_validator_json("")
         assert result["product_name"] == "Unknown"
 
+    def test_json_fence_preferred_over_earlier_bare_fence(self):
+        response = 'Spec:\n```\nfeature list\n```\nResult:\n```json\n{"product_name": "X1"}\n```'
+        assert _parse_validator_json(response)["product_name"] == "X1"
+
+    def test_unterminated_fence(self):
+        response = '```json\n{"product_name": "X1", "confidence": 0.7}'
+        result = _parse_validator_json(response)
+        assert result["product_name"] == "X1"
+        assert result["launch_date"] == "TBD"
+
+    def test_non_object_block_returns_defaults(self):
+        result = _parse_validator_json('```json\n["X1", "X2"]\n```')
+        assert result["product_name"] == "Unknown"
+
+    def test_prose_in_fence_returns_defaults(self):
+        result = _parse_validator_json("```\nNo launch found here.\n```")
+        assert result["launch_date"] == "TBD"
+
 
 # ═════════════════════════════════════════════════════════════════════════
 # ASSESSOR JSON PARSING TESTS
@@ -373,6 +477,11 @@ class TestParseAssessorJson:
         result = _parse_assessor_json('```json\n{broken\n```')
         assert result["threat_level"] == "medium"
 
+    def test_defaults_not_shared_between_calls(self):
+        first = _parse_assessor_json("no json")
+        first["immediate_actions"].append("Call the press")
+        assert _parse_assessor_json("no json")["immediate_actions"] == []
+
 
 # ═════════════════════════════════════════════════════════════════════════
 # SIGNAL PROCESSING TESTS
@@ -399,6 +508,12 @@ class TestPrepareSignalSummary:
         assert "Engagement: 500" in result
         assert "Big announcement coming" in result
 
+    def test_aware_timestamp_drops_offset(self):
+        ts = datetime(2026, 2, 1, 14, 30, 45, tzinfo=timezone.utc)
+        signals = [LaunchSignal(source="reddit", content="Test", timestamp=ts)]
+        result = _prepare_signal_summary(signals)
+        assert "] 2026-02-01 14:30\n" in result
+
     def test_no_engagement_omits_field(self):
         signals = [LaunchSignal(source="reddit", content="Test", timestamp=datetime(2026, 2, 1))]
         result = _prepare_signal_summary(signals)
@@ -454,6 +569,15 @@ class TestGetSignalSources:
         sources = _get_signal_sources(signals)
         assert sources == ["twitter"]
 
+    def test_first_seen_order(self):
+        signals = [
+            LaunchSignal(source="reddit", content="a"),
+            LaunchSignal(source="news", content="b"),
+            LaunchSignal(source="reddit", content="c"),
+            LaunchSignal(source="twitter", content="d"),
+        ]
+        assert _get_signal_sources(signals) == ["reddit", "news", "twitter"]
+
 
 class TestGetDetailedSignals:
 
@@ -471,3 +595,16 @@ class TestGetDetailedSignals:
 
     def test_empty_signals(self):
         assert _get_detailed_signals([]) == "No detailed signals available"
+
+    def test_large_batch_matches_full_sort(self):
+        """Heap selection keeps the same picks and tie order as a stable sort."""
+        signals = [
+            LaunchSignal(source=f"src{i}", content=f"post {i}", engagement=i % 7)
+            for i in range(300)
+        ]
+        expected_order = sorted(signals, key=lambda x: x.engagement, reverse=True)[:5]
+        expected = "\n".join(
+            line for sig in expected_order
+            for line in (f"=== [{sig.source.upper()}] ===", sig.content, "")
+        )
+        assert _get_detailed_signals(signals) == expected
@@ -12,10 +12,12 @@ from decimal import Decimal
 from dataclasses import dataclass, field
 from typing import Optional
 
+from .helpers import extract_json_block as _extract_json_block, json_loads
+
 
 # ── Local replicas of data classes ──
 
-@dataclass
+@dataclass(slots=True)
 class ProductInfo:
     name: str
     price: Decimal
@@ -23,7 +25,7 @@ class ProductInfo:
     features: list = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class PricingRecommendation:
     recommended_price: Decimal
     confidence: float
@@ -34,30 +36,98 @@ class PricingRecommendation:
     key_factors: list = field(default_factory=list)
 
 
-# ── Helper method extracted from VisualPricingAnalyzer ──
+@dataclass
+class ImageAnalysisResult:
+    product_name: Optional[str] = None
+    price: Optional[str] = None
+    currency: Optional[str] = None
+    features: list = None
+    reviews_summary: Optional[str] = None
+    promo_signals: list = None
+    confidence: float = 0.0
+    raw_text: str = ""
+
+    @classmethod
+    def from_dict(cls, data, raw_text=""):
+        return cls(
+            product_name=data.get("product_name"),
+            price=data.get("price"),
+            currency=data.get("currency"),
+            features=data.get("features", []),
+            reviews_summary=data.get("reviews_summary"),
+            promo_signals=data.get("promo_signals", []),
+            confidence=data.get("confidence", 0.5),
+            raw_text=raw_text,
+        )
 
-def _parse_recommendation(response: str, your_product: ProductInfo) -> PricingRecommendation:
+
+# ── Helper methods extracted from VisualPricingAnalyzer ──
+
+def _parse_scout_json(response):
+    json_str = _extract_json_block(response)
+    if json_str is None:
+        return None
     try:
-        if "```json" in response:
-            json_str = response.split("```json")[1].split("```")[0]
-        elif "```" in response:
-            json_str = response.split("```")[1].split("```")[0]
-        else:
-            match = re.search(r'\{[^{}]*"recommended_price"[^{}]*\}', response)
-            if match:
-                json_str = match.group()
-            else:
-                raise ValueError("No JSON found in response")
+        data = json_loads(json_str)
+        return ImageAnalysisResult.from_dict(data, raw_text=response)
+    except Exception:
+        return None
+
+
+_UNKNOWN_POSITION = ("unknown", 0.0)
+_RECO_RE = re.compile(r'\{[^{}]*"recommended_price"[^{}]*\}')
 
-        data = json.loads(json_str.strip())
 
-        recommended_price = Decimal(str(data.get("recommended_price", your_product.price)))
-        current_price = Decimal(str(your_product.price))
+def _calculate_price_position(your_price, competitor_price_str):
+    if not competitor_price_str:
+        return _UNKNOWN_POSITION
+    cleaned = ''.join(c for c in str(competitor_price_str) if c.isdigit() or c == '.')
+    if not cleaned:
+        return _UNKNOWN_POSITION
+    try:
+        competitor_price = float(cleaned)
+    except ValueError:
+        return _UNKNOWN_POSITION
+    if competitor_price <= 0:
+        return _UNKNOWN_POSITION
+    price_diff_percent = ((your_price - competitor_price) / competitor_price) * 100
+    position = "premium" if price_diff_percent > 5 else "discount" if price_diff_percent < -5 else "competitive"
+    return position, price_diff_percent
+
+
+def _fallback_recommendation(response: str, your_product: ProductInfo) -> PricingRecommendation:
+    return PricingRecommendation(
+        recommended_price=your_product.price,
+        confidence=0.3,
+        reasoning=response,
+        price_change_percent=0,
+        strategy="maintain",
+        risk_level="medium",
+        key_factors=["Unable to parse AI recommendation"],
+    )
+
+
+def _parse_recommendation(response: str, your_product: ProductInfo) -> PricingRecommendation:
+    json_str = _extract_json_block(response)
+    if json_str is None:
+        match = _RECO_RE.search(response)
+        json_str = match.group() if match else ""
+    json_str = json_str.strip()
 
-        if current_price > 0:
-            change_percent = float((recommended_price - current_price) / current_price * 100)
+    if not json_str.startswith("{"):
+        return _fallback_recommendation(response, your_product)
+
+    try:
+        data = json_loads(json_str)
+
+        raw_price = data.get("recommended_price", your_product.price)
+        recommended_price = raw_price if isinstance(raw_price, Decimal) else Decimal(str(raw_price))
+
+        cf = float(your_product.price)
+        if cf > 0:
+            change_percent = (float(raw_price) - cf) / cf * 100.0
         else:
-            change_percent = 0
+            change_percent = 0.0
 
         return PricingRecommendation(
             recommended_price=recommended_price,
@@ -70,15 +140,7 @@ def _parse_recommendation(response: str, your_product: ProductInfo) -> PricingRe
         )
 
     except Exception:
-        return PricingRecommendation(
-            recommended_price=your_product.price,
-            confidence=0.3,
-            reasoning=response,
-            price_change_percent=0,
-            strategy="maintain",
-            risk_level="medium",
-            key_factors=["Unable to parse AI recommendation"],
-        )
+        return _fallback_recommendation(response, your_product)
 
 
 # ═════════════════════════════════════════════════════════════════════════
@@ -186,11 +248,31 @@ This should increase conversion rates.'''
         assert result.recommended_price == product_29.price
         assert result.confidence == 0.3
 
+    @pytest.mark.skipif(json_loads is json.loads, reason="stdlib json accepts NaN and 1e999")
+    @pytest.mark.parametrize("price", ["NaN", "Infinity", "1e999"])
+    def test_non_finite_price_returns_safe_default(self, product_29, price):
+        response = '```json\n{"recommended_price": ' + price + ', "confidence": 0.9}\n```'
+        result = _parse_recommendation(response, product_29)
+        assert result.recommended_price == product_29.price
+        assert result.confidence == 0.3
+
     def test_empty_response_returns_safe_default(self, product_29):
         result = _parse_recommendation("", product_29)
         assert result.recommended_price == product_29.price
         assert result.strategy == "maintain"
 
+    def test_prose_in_fence_returns_safe_default(self, product_29):
+        response = "```\nHold the price for now.\n```"
+        result = _parse_recommendation(response, product_29)
+        assert result.recommended_price == product_29.price
+        assert result.confidence == 0.3
+
+    def test_string_price_is_accepted(self, product_29):
+        response = '```json\n{"recommended_price": "26.991"}\n```'
+        result = _parse_recommendation(response, product_29)
+        assert result.recommended_price == Decimal("26.991")
+        assert result.price_change_percent == pytest.approx(-10.0)
+
     def test_missing_fields_use_defaults(self, product_29):
         response = '```json\n{"recommended_price": 22.00}\n```'
         result = _parse_recommendation(response, product_29)
@@ -201,6 +283,90 @@ This should increase conversion rates.'''
         assert result.key_factors == []  # Default
 
 
+# ═════════════════════════════════════════════════════════════════════════
+# SCOUT EXTRACTION PARSING TESTS
+# ═════════════════════════════════════════════════════════════════════════
+
+
+class TestParseScoutJson:
+
+    def test_stream_ending_in_json_block(self):
+        response = '''OBSERVATION: I see a pair of wireless earbuds.
+
+RECOMMENDATION: Match the 20% discount.
+
+```json
+{
+  "product_name": "SoundPods Pro",
+  "price": "$24.99",
+  "currency": "USD",
+  "features": ["ANC", "30h battery"],
+  "promo_signals": ["20% off"],
+  "confidence": 0.9
+}
+```'''
+        result = _parse_scout_json(response)
+        assert result.product_name == "SoundPods Pro"
+        assert result.price == "$24.99"
+        assert result.features == ["ANC", "30h battery"]
+        assert result.promo_signals == ["20% off"]
+        assert result.confidence == 0.9
+        assert "wireless earbuds" in result.raw_text
+
+    def test_missing_fields_use_defaults(self):
+        result = _parse_scout_json('```json\n{"product_name": "Widget"}\n```')
+        assert result.product_name == "Widget"
+        assert result.price is None
+        assert result.confidence == 0.5
+
+    def test_no_json_block_returns_none(self):
+        """No fence means the caller falls back to a separate extraction call."""
+        assert _parse_scout_json("I see a product priced at $29.99.") is None
+
+    def test_malformed_json_returns_none(self):
+        assert _parse_scout_json('```json\n{broken json\n```') is None
+
+
+# ═════════════════════════════════════════════════════════════════════════
+# PRICE POSITION TESTS
+# ═════════════════════════════════════════════════════════════════════════
+
+
+class TestCalculatePricePosition:
+
+    def test_premium(self):
+        position, diff = _calculate_price_position(120.0, "$100.00")
+        assert position == "premium"
+        assert diff == pytest.approx(20.0)
+
+    def test_discount(self):
+        position, diff = _calculate_price_position(80.0, "$100.00")
+        assert position == "discount"
+        assert diff == pytest.approx(-20.0)
+
+    def test_competitive_within_5_percent(self):
+        position, _ = _calculate_price_position(103.0, "100")
+        assert position == "competitive"
+
+    def test_strips_currency_symbols(self):
+        position, diff = _calculate_price_position(29.99, "€29.99 EUR")
+        assert position == "competitive"
+        assert diff == pytest.approx(0.0)
+
+    def test_missing_price_is_unknown(self):
+        assert _calculate_price_position(29.99, None) == ("unknown", 0.0)
+        assert _calculate_price_position(29.99, "") == ("unknown", 0.0)
+
+    def test_price_without_digits_is_unknown(self):
+        assert _calculate_price_position(29.99, "Call for price") == ("unknown", 0.0)
+
+    def test_unparseable_price_is_unknown(self):
+        assert _calculate_price_position(29.99, "1.299.00") == ("unknown", 0.0)
+
+    def test_zero_price_is_unknown(self):
+        assert _calculate_price_position(29.99, "$0.00") == ("unknown", 0.0)
+
+
 # ═════════════════════════════════════════════════════════════════════════
 # PRICE CHANGE CALCULATION TESTS
 # ═════════════════════════════════════════════════════════════════════════